@@ -0,0 +1,15 @@
+"""Reusable pieces of the BrainTumor notebook (data loading, pipelines, tooling).
+
+The Colab notebook (braintumor.py) imports from here so the same code can be
+used from scripts and benchmarks without mounting Google Drive.
+
+    data, cache, dedup   loading, preprocessed cache, near-duplicate groups
+    pipeline, records    tf.data pipelines (in-memory indices, TFRecord shards)
+    model, train         the CNN, training modes, checkpoints, profiling
+    transfer             pretrained backbone with cached features, fine-tuning
+    evaluate, explain    single-pass metrics, batched Grad-CAM heatmaps
+    infer, serve, export batch/single-image prediction, HTTP service, TFLite
+
+Importing the package (or data, cache, dedup, pipeline, evaluate, explain, infer,
+serve) does not import TensorFlow; it is loaded when first needed.
+"""
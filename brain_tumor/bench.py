@@ -0,0 +1,550 @@
+"""Training/inference throughput benchmark on synthetic data.
+
+Generates a `no/` / `yes/` folder of synthetic JPG/PNG scans, then times each
+stage of the pipeline: load, split, tf.data construction, one training epoch
+of the Sequential CNN and batch inference. Results go to a JSON file so runs
+can be compared across versions on CPU-only machines.
+
+    python -m brain_tumor.bench --count 500 --size 256 --out bench.json
+    python -m brain_tumor.bench --compare-balancing --target-ratio 1 1 --out balance.json
+    python -m brain_tumor.bench --startup brain_tumor.keras scan.jpg --out startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from .dedup import DEDUP
+from .resources import current_rss_mb, peak_rss_mb
+
+
+def write_synthetic_dataset(root, count_per_class=200, size=(256, 256),
+                            formats=('jpg', 'png'), seed=0):
+    """Write `count_per_class` random scans to root/no and root/yes.
+
+    'yes' images get a bright blob so the classes are learnable. Formats
+    alternate between the given extensions. Returns [no_dir, yes_dir].
+    """
+    rng = np.random.default_rng(seed)
+    class_dirs = [os.path.join(root, 'no'), os.path.join(root, 'yes')]
+    yy, xx = np.mgrid[0:size[1], 0:size[0]]
+    for label, folder in enumerate(class_dirs):
+        os.makedirs(folder, exist_ok=True)
+        for i in range(count_per_class):
+            pixels = rng.normal(60, 25, (size[1], size[0])).clip(0, 255)
+            if label == 1:
+                cx, cy = rng.uniform(0.25, 0.75, 2) * size
+                radius = rng.uniform(0.05, 0.15) * min(size)
+                pixels[(xx - cx) ** 2 + (yy - cy) ** 2 < radius ** 2] += 120
+            img = Image.fromarray(pixels.clip(0, 255).astype(np.uint8)).convert('RGB')
+            img.save(os.path.join(folder, f"scan_{i:06d}.{formats[i % len(formats)]}"))
+    return class_dirs
+
+
+def load_split_dataset(data_dir=None, count_per_class=200, size=(256, 256), target_size=(128, 128),
+                       dedup=DEDUP, num_workers=None):
+    """(data, labels, (train_idx, val_idx, test_idx)) of `data_dir` (synthetic data when None).
+
+    The split is the canonical one (dedup.dataset_split), so benchmarks
+    score on the same held-out images as training.
+    """
+    from .data import load_image_folders
+    from .dedup import dataset_split
+
+    tmp = None
+    if data_dir is None:
+        tmp = tempfile.TemporaryDirectory(prefix='brain_tumor_bench_')
+        data_dir = tmp.name
+        write_synthetic_dataset(data_dir, count_per_class, size)
+    try:
+        data, labels, _, _ = load_image_folders(
+            [os.path.join(data_dir, 'no'), os.path.join(data_dir, 'yes')], target_size, num_workers=num_workers)
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+    return data, labels, dataset_split(data, labels, dedup=dedup)
+
+
+class StageTimer:
+    """Collects wall time and memory per named stage."""
+
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, fn, items=None, batches=None):
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - start
+        stage = {'seconds': seconds,
+                 'rss_mb': current_rss_mb(),
+                 'rss_delta_mb': current_rss_mb() - rss_before,
+                 'peak_rss_mb': peak_rss_mb()}
+        self.stages[name] = stage
+        self.add_rate(name, items, batches)
+        print(f"{name}: {seconds:.3f}s" + (f", {stage['images_per_sec']:.1f} images/sec" if items else ""))
+        return result
+
+    def add_rate(self, name, items=None, batches=None):
+        stage = self.stages[name]
+        if items:
+            stage['images_per_sec'] = items / stage['seconds']
+        if batches:
+            stage['ms_per_batch'] = 1000.0 * stage['seconds'] / batches
+
+
+def run_benchmark(data_dir=None, count_per_class=200, size=(256, 256), target_size=(128, 128),
+                  batch_size=128, num_workers=None, augment=True):
+    """Run every stage once and return the results as a dict."""
+    import tensorflow as tf
+
+    from .data import load_image_folders
+    from .model import build_model, compile_model
+    from .dedup import dataset_split
+    from .pipeline import make_dataset
+
+    timer = StageTimer()
+    tmp = None
+    if data_dir is None:
+        tmp = tempfile.TemporaryDirectory(prefix='brain_tumor_bench_')
+        data_dir = tmp.name
+        timer.run('generate', lambda: write_synthetic_dataset(data_dir, count_per_class, size))
+    class_dirs = [os.path.join(data_dir, 'no'), os.path.join(data_dir, 'yes')]
+
+    try:
+        data, labels, _, _ = timer.run(
+            'load', lambda: load_image_folders(class_dirs, target_size, num_workers=num_workers))
+        timer.add_rate('load', len(data))
+        train_idx, val_idx, test_idx = timer.run('split', lambda: dataset_split(data, labels))
+        train_dataset, test_dataset = timer.run('tf_data', lambda: (
+            make_dataset(data, labels, train_idx, batch_size, shuffle=True, augment=augment),
+            make_dataset(data, labels, test_idx, batch_size),
+        ))
+
+        model = compile_model(build_model(input_shape=data.shape[1:]))
+        train_batches = -(-len(train_idx) // batch_size)
+        test_batches = -(-len(test_idx) // batch_size)
+        # The first epoch includes graph tracing; time a second one for steady state
+        timer.run('train_epoch_first', lambda: model.fit(train_dataset, epochs=1, verbose=0),
+                  items=len(train_idx), batches=train_batches)
+        timer.run('train_epoch', lambda: model.fit(train_dataset, epochs=1, verbose=0),
+                  items=len(train_idx), batches=train_batches)
+        model.predict(test_dataset.take(1), verbose=0) # Warm up the predict function
+        timer.run('predict', lambda: model.predict(test_dataset, verbose=0),
+                  items=len(test_idx), batches=test_batches)
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {'count_per_class': count_per_class, 'source_size': list(size),
+                   'target_size': list(target_size), 'batch_size': batch_size,
+                   'num_workers': num_workers, 'augment': augment},
+        'environment': {'python': platform.python_version(), 'tensorflow': tf.__version__,
+                        'numpy': np.__version__, 'cpu_count': os.cpu_count(),
+                        'machine': platform.machine()},
+        'stages': timer.stages,
+    }
+
+
+def compare_architectures(data_dir=None, count_per_class=200, size=(256, 256),
+                          target_size=(128, 128), batch_size=64, epochs=5,
+                          architectures=None, latency_runs=50):
+    """Parameters, FLOPs, CPU latency and test accuracy of each model architecture.
+
+    Every architecture is trained for `epochs` on the same split of the same
+    (synthetic by default) data, so the accuracies are comparable to each
+    other but not to a full 30-epoch run.
+    """
+    import tensorflow as tf
+
+    from .model import ARCHITECTURES, build_model, compile_model, count_flops
+    from .pipeline import make_dataset
+
+    data, labels, (train_idx, val_idx, test_idx) = load_split_dataset(data_dir, count_per_class, size, target_size)
+    train_dataset = make_dataset(data, labels, train_idx, batch_size, shuffle=True, augment=True)
+    val_dataset = make_dataset(data, labels, val_idx, batch_size)
+    test_dataset = make_dataset(data, labels, test_idx, batch_size)
+    single = tf.constant(data[test_idx[:1]].astype(np.float32) / 255.0)
+    batch = tf.constant(data[test_idx[:batch_size]].astype(np.float32) / 255.0)
+
+    results = {}
+    for architecture in architectures or ARCHITECTURES:
+        model = compile_model(build_model(data.shape[1:], architecture=architecture))
+        start = time.perf_counter()
+        model.fit(train_dataset, epochs=epochs, validation_data=val_dataset, verbose=0)
+        train_seconds = time.perf_counter() - start
+        _, accuracy = model.evaluate(test_dataset, verbose=0)
+
+        forward = tf.function(lambda x: model(x, training=False))
+        latencies = {}
+        for name, x in (('batch1', single), (f"batch{int(batch.shape[0])}", batch)):
+            forward(x) # Trace outside the timing
+            start = time.perf_counter()
+            for _ in range(latency_runs):
+                forward(x)
+            latencies[name] = 1000.0 * (time.perf_counter() - start) / latency_runs
+        results[architecture] = {'params': int(model.count_params()), 'flops': int(count_flops(model)),
+                                 'latency_ms': latencies, 'test_accuracy': float(accuracy),
+                                 'train_seconds_per_epoch': train_seconds / epochs}
+        print(f"{architecture:10s} params {model.count_params():>10,}  FLOPs {count_flops(model) / 1e6:8.1f}M  "
+              f"batch1 {latencies['batch1']:.2f} ms  test acc {accuracy:.4f}")
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'config': {'count_per_class': count_per_class, 'target_size': list(target_size),
+                       'batch_size': batch_size, 'epochs': epochs},
+            'architectures': results}
+
+
+def compare_training_modes(data_dir=None, count_per_class=200, size=(256, 256),
+                           target_size=(128, 128), batch_size=64, epochs=3, modes=None,
+                           architecture='flatten'):
+    """Per-epoch wall time of each training mode (float32 / XLA / bfloat16).
+
+    The first epoch includes tracing and XLA compilation, so the steady-state
+    figure is the mean of the remaining epochs.
+    """
+    from .model import build_model, compile_model
+    from .pipeline import make_dataset
+    from .train import TRAINING_MODES, EpochTimeLogger, cpu_supports_bf16, resolve_training_mode
+
+    data, labels, (train_idx, val_idx, _) = load_split_dataset(data_dir, count_per_class, size, target_size)
+    train_dataset = make_dataset(data, labels, train_idx, batch_size, shuffle=True, augment=True)
+    val_dataset = make_dataset(data, labels, val_idx, batch_size)
+
+    results = {}
+    for mode in modes or TRAINING_MODES:
+        precision, jit_compile = resolve_training_mode(mode)
+        model = compile_model(build_model(data.shape[1:], architecture=architecture, precision=precision),
+                              jit_compile=jit_compile)
+        timer = EpochTimeLogger(mode)
+        history = model.fit(train_dataset, epochs=epochs, validation_data=val_dataset,
+                            callbacks=[timer], verbose=0)
+        steady = timer.epoch_seconds[1:] or timer.epoch_seconds
+        results[mode] = {'epoch_seconds': timer.epoch_seconds,
+                         'steady_epoch_seconds': sum(steady) / len(steady),
+                         'images_per_sec': len(train_idx) * len(steady) / sum(steady),
+                         'final_val_loss': float(history.history['val_loss'][-1])}
+    baseline = results.get('float32', {}).get('steady_epoch_seconds')
+    for mode, row in results.items():
+        if baseline:
+            row['speedup_vs_float32'] = baseline / row['steady_epoch_seconds']
+        print(f"{mode:14s} {row['steady_epoch_seconds']:.2f} s/epoch  {row['images_per_sec']:.1f} images/sec"
+              + (f"  x{row['speedup_vs_float32']:.2f}" if baseline else ""))
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'config': {'count_per_class': count_per_class, 'target_size': list(target_size),
+                       'batch_size': batch_size, 'epochs': epochs, 'architecture': architecture,
+                       'cpu_bf16': cpu_supports_bf16()},
+            'modes': results}
+
+
+def compare_tta(model_path, data_dir, views=(1, 2, 4, 8), target_size=(128, 128), batch_size=32,
+                latency_runs=20):
+    """Test-split accuracy/AUC and latency of TTA with each number of views.
+
+    The test split is the one held out during training (dedup.dataset_split
+    with the notebook's near-duplicate grouping). Latency is per batch of
+    `batch_size` images and per single image.
+    """
+    import tensorflow as tf
+
+    from .augment import make_tta_predict_fn
+    from .evaluate import Evaluator
+
+    model = tf.keras.models.load_model(model_path, compile=False)
+    data, labels, (_, _, test_idx) = load_split_dataset(data_dir, target_size=target_size)
+    images, test_labels = data[test_idx], labels[test_idx]
+
+    results = {}
+    for count in views:
+        predict = make_tta_predict_fn(model, count)
+        evaluator = Evaluator()
+        for i in range(0, len(images), batch_size):
+            evaluator.update(test_labels[i:i + batch_size], predict(images[i:i + batch_size]))
+        result = evaluator.result()
+        row = {'accuracy': result['accuracy'], 'auc': result.get('auc'), 'loss': result['loss']}
+        for name, batch in (('batch', images[:batch_size]), ('single', images[:1])):
+            predict(batch) # Warm up / trace
+            start = time.perf_counter()
+            for _ in range(latency_runs):
+                predict(batch)
+            row[f'{name}_latency_ms'] = 1000.0 * (time.perf_counter() - start) / latency_runs
+        results[count] = row
+    base = results[min(results)]
+    for count, row in results.items():
+        row['latency_overhead'] = row['batch_latency_ms'] / base['batch_latency_ms']
+        row['auc_gain'] = (row['auc'] - base['auc']) if row['auc'] is not None and base['auc'] is not None else None
+        print(f"TTA x{count}: acc {row['accuracy']:.4f}  AUC {row['auc'] or float('nan'):.4f}  "
+              f"{row['single_latency_ms']:.1f} ms/image, {row['batch_latency_ms']:.1f} ms/batch "
+              f"(x{row['latency_overhead']:.2f})")
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'model': model_path,
+            'test_images': int(len(images)), 'batch_size': batch_size,
+            'results': {str(k): v for k, v in results.items()}}
+
+
+def compare_balancing(data_dir=None, count_per_class=200, size=(256, 256), target_size=(128, 128),
+                      batch_size=128, epochs=3, target_ratio=(1, 1), keep_positive=0.25, augment=True):
+    """Input throughput and observed class shares of the class-balancing options.
+
+    'none' is the plain shuffled pipeline, 'sample' make_dataset(balance=...)
+    and 'weights' the plain pipeline plus class_weights() for model.fit (the
+    input is unchanged, so its throughput is that of 'none'). To get an
+    imbalanced training set from balanced (e.g. synthetic) data, only
+    `keep_positive` of the positive training images are used; pass 1.0 for
+    a dataset that is imbalanced already. Each mode is iterated for `epochs`
+    epochs after a warm-up pass.
+    """
+    from .pipeline import balance_report, class_weights, make_dataset
+
+    data, labels, (train_idx, _, _) = load_split_dataset(data_dir, count_per_class, size, target_size)
+    positives = train_idx[labels[train_idx] == 1]
+    train_idx = np.sort(np.concatenate([train_idx[labels[train_idx] != 1],
+                                        positives[:max(1, int(len(positives) * keep_positive))]]))
+    report = balance_report(labels[train_idx], target_ratio)
+    weights = class_weights(labels[train_idx], target_ratio)
+
+    results = {}
+    for mode in ('none', 'sample'):
+        dataset = make_dataset(data, labels, train_idx, batch_size, shuffle=True, augment=augment, seed=0,
+                               balance=target_ratio if mode == 'sample' else None)
+        for _ in dataset: # Warm up: tracing and AUTOTUNE
+            pass
+        counts = np.zeros(len(report), dtype=np.int64)
+        start = time.perf_counter()
+        for _ in range(epochs):
+            for _, batch_labels in dataset:
+                counts += np.bincount(batch_labels.numpy().astype(np.int64), minlength=len(counts))
+        seconds = time.perf_counter() - start
+        results[mode] = {'images_per_sec': int(counts.sum()) / seconds,
+                         'observed_fraction': {str(c): float(n / counts.sum()) for c, n in enumerate(counts)}}
+    # Class weights leave the stream alone; their effect is each class's share of the total loss weight
+    natural = np.array([report[str(c)]['natural_fraction'] for c in range(len(report))])
+    weighted = natural * np.array([weights[c] for c in range(len(report))])
+    results['weights'] = {'images_per_sec': results['none']['images_per_sec'], 'class_weight': weights,
+                          'effective_fraction': {str(c): float(f) for c, f in enumerate(weighted / weighted.sum())}}
+    base = results['none']['images_per_sec']
+    for mode, row in results.items():
+        row['throughput_vs_none'] = row['images_per_sec'] / base
+        shares = row.get('observed_fraction') or row['effective_fraction']
+        print(f"{mode:8s} {row['images_per_sec']:8.1f} images/sec (x{row['throughput_vs_none']:.2f})  "
+              f"class shares " + ", ".join(f"{c}: {share:.3f}" for c, share in shares.items()))
+    for c, row in report.items():
+        print(f"class {c}: {row['count']} images, natural {row['natural_fraction']:.3f} -> "
+              f"target {row['target_fraction']:.3f}, {row['draws_per_image']:.2f} draws/image/epoch")
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'config': {'train_images': int(len(train_idx)), 'target_ratio': list(target_ratio),
+                       'keep_positive': keep_positive, 'batch_size': batch_size, 'epochs': epochs,
+                       'augment': augment},
+            'classes': report, 'modes': results}
+
+
+def compare_transfer(data_dir=None, count_per_class=200, size=(256, 256), target_size=(128, 128),
+                     batch_size=64, epochs=5, backbone='mobilenet_v2', weights=None, fine_tune_epochs=1):
+    """Epoch time and test accuracy/AUC: scratch CNN vs. head on cached backbone features.
+
+    The transfer row includes the one-time feature extraction and, with
+    fine_tune_epochs, the per-epoch cost of fine-tuning. Without `weights`
+    the backbone is random, so only its timings are meaningful.
+    """
+    from .evaluate import evaluate_model
+    from .model import build_model, compile_model
+    from .pipeline import make_dataset
+    from .train import EpochTimeLogger
+    from .transfer import train_transfer
+
+    data, labels, (train_idx, val_idx, test_idx) = load_split_dataset(data_dir, count_per_class, size, target_size)
+    test_dataset = make_dataset(data, labels, test_idx, batch_size)
+
+    def test_metrics(model):
+        result, _ = evaluate_model(model, test_dataset)
+        return {'test_accuracy': result['accuracy'], 'test_auc': result.get('auc')}
+
+    def steady(seconds):
+        seconds = seconds[1:] or seconds # Epoch 1 includes tracing
+        return sum(seconds) / len(seconds)
+
+    model = compile_model(build_model(data.shape[1:]))
+    timer = EpochTimeLogger('scratch')
+    start = time.perf_counter()
+    model.fit(make_dataset(data, labels, train_idx, batch_size, shuffle=True, augment=True),
+              validation_data=make_dataset(data, labels, val_idx, batch_size), epochs=epochs,
+              callbacks=[timer], verbose=0)
+    results = {'scratch': {'epoch_seconds': timer.epoch_seconds, 'steady_epoch_seconds': steady(timer.epoch_seconds),
+                           'total_seconds': time.perf_counter() - start, **test_metrics(model)}}
+
+    start = time.perf_counter()
+    # No paths: the features go to a temporary file, so every run pays the extraction
+    model, report = train_transfer(data, labels, train_idx, val_idx, backbone_name=backbone, weights=weights,
+                                   epochs=epochs, fine_tune_epochs=fine_tune_epochs, batch_size=batch_size)
+    total = time.perf_counter() - start
+    row = {'extract_seconds': report['extract_seconds'], 'epoch_seconds': report['head_epoch_seconds'],
+           'steady_epoch_seconds': steady(report['head_epoch_seconds']), 'total_seconds': total,
+           **test_metrics(model)}
+    if fine_tune_epochs:
+        row['fine_tune_epoch_seconds'] = report['fine_tune_epoch_seconds']
+    results['transfer'] = row
+    for name, row in results.items():
+        print(f"{name:9s} {row['steady_epoch_seconds']:7.2f} s/epoch  {row['total_seconds']:7.1f} s total  "
+              f"test acc {row['test_accuracy']:.4f}  AUC {row['test_auc'] or float('nan'):.4f}"
+              + (f"  (extraction {row['extract_seconds']:.1f} s)" if 'extract_seconds' in row else ""))
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'config': {'images': int(len(data)), 'target_size': list(target_size), 'batch_size': batch_size,
+                       'epochs': epochs, 'backbone': backbone, 'weights': weights,
+                       'fine_tune_epochs': fine_tune_epochs},
+            'results': results}
+
+
+def measure_gradcam(model_path, data_dir, target_size=(128, 128), batch_size=64, runs=10):
+    """Per-image cost of Grad-CAM in batch inference: prediction alone vs. with heatmaps and overlays.
+
+    'predict' is the plain batched forward pass, 'gradcam' the forward +
+    backward pass that returns probabilities and heatmaps, 'overlays' the
+    colorizing and JPEG writing on top of it.
+    """
+    from .data import load_image_folders
+    from .explain import make_gradcam_fn, save_overlays
+    from .infer import load_model
+
+    model = load_model(model_path)
+    data, _, paths, _ = load_image_folders([os.path.join(data_dir, 'no'), os.path.join(data_dir, 'yes')],
+                                           target_size)
+    images, paths = data[:batch_size], paths[:batch_size]
+    explain = make_gradcam_fn(model)
+
+    def predict():
+        model.predict_on_batch(images.astype(np.float32) / 255.0)
+
+    def gradcam():
+        return explain(images)
+
+    with tempfile.TemporaryDirectory(prefix='brain_tumor_gradcam_') as out_dir:
+        def overlays():
+            _, heatmaps = explain(images)
+            save_overlays(images, heatmaps, paths, out_dir)
+
+        results = {}
+        for name, fn in (('predict', predict), ('gradcam', gradcam), ('overlays', overlays)):
+            fn() # Warm up / trace
+            start = time.perf_counter()
+            for _ in range(runs):
+                fn()
+            results[name] = {'ms_per_image': 1000.0 * (time.perf_counter() - start) / (runs * len(images))}
+    for name, row in results.items():
+        row['overhead_vs_predict'] = row['ms_per_image'] / results['predict']['ms_per_image']
+        print(f"{name:9s} {row['ms_per_image']:.2f} ms/image (x{row['overhead_vs_predict']:.2f})")
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'model': model_path,
+            'batch_size': len(images), 'runs': runs, 'results': results}
+
+
+_STARTUP_SCRIPTS = {
+    # name: code run in a fresh interpreter; `model_path` and `image_path` are defined
+    'import_brain_tumor': "import brain_tumor.data, brain_tumor.pipeline, brain_tumor.infer, brain_tumor.evaluate",
+    'import_tensorflow': "import tensorflow",
+    'first_prediction': ("from brain_tumor.infer import load_model, predict_image\n"
+                         "predict_image(load_model(model_path), image_path)"),
+}
+
+
+def measure_startup(model_path, image_path, runs=3):
+    """Median wall time of each _STARTUP_SCRIPTS entry in a fresh Python process.
+
+    first_prediction is the cold start of an inference process: interpreter
+    start, imports, model load and one prediction.
+    """
+    import statistics
+    import subprocess
+    import sys
+
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [package_parent,
+                                                                     os.environ.get('PYTHONPATH')])))
+    results = {}
+    for name, code in _STARTUP_SCRIPTS.items():
+        script = f"model_path = {model_path!r}\nimage_path = {image_path!r}\n{code}"
+        seconds = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', script], env=env, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            seconds.append(time.perf_counter() - start)
+        results[name] = {'median_seconds': statistics.median(seconds), 'runs': seconds}
+        print(f"{name:20s} {results[name]['median_seconds']:.2f}s")
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'platform': platform.platform(),
+            'python': platform.python_version(), 'startup': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--data-dir', help="existing folder with no/ and yes/ (default: synthetic)")
+    parser.add_argument('--count', type=int, default=200, help="synthetic images per class")
+    parser.add_argument('--size', type=int, nargs='+', default=[256], help="synthetic image size (W [H])")
+    parser.add_argument('--target-size', type=int, default=128)
+    parser.add_argument('--batch-size', type=int, default=128)
+    parser.add_argument('--workers', type=int, default=None, help="loader workers (default: CPU count)")
+    parser.add_argument('--no-augment', action='store_true')
+    parser.add_argument('--compare-architectures', action='store_true',
+                        help="compare params/FLOPs/latency/accuracy of the model architectures instead")
+    parser.add_argument('--compare-training-modes', action='store_true',
+                        help="compare per-epoch time of float32 / XLA / bfloat16 training instead")
+    parser.add_argument('--epochs', type=int, default=5, help="training epochs per architecture or mode")
+    parser.add_argument('--compare-tta', metavar='MODEL',
+                        help="test-split accuracy/AUC vs latency of test-time augmentation (needs --data-dir)")
+    parser.add_argument('--compare-balancing', action='store_true',
+                        help="compare input throughput and class shares of the class-balancing options instead")
+    parser.add_argument('--target-ratio', type=float, nargs='+', default=[1.0, 1.0],
+                        help="per-class target ratio for --compare-balancing")
+    parser.add_argument('--keep-positive', type=float, default=0.25,
+                        help="share of positive training images kept by --compare-balancing (1 = all)")
+    parser.add_argument('--compare-transfer', action='store_true',
+                        help="compare the scratch CNN with a head on cached backbone features instead")
+    parser.add_argument('--backbone', default='mobilenet_v2', help="backbone for --compare-transfer")
+    parser.add_argument('--backbone-weights', help="local no-top weights file for --compare-transfer")
+    parser.add_argument('--fine-tune-epochs', type=int, default=1, help="fine-tuning epochs for --compare-transfer")
+    parser.add_argument('--gradcam', metavar='MODEL',
+                        help="per-image cost of Grad-CAM heatmaps and overlays in batch inference (needs --data-dir)")
+    parser.add_argument('--startup', nargs=2, metavar=('MODEL', 'IMAGE'),
+                        help="measure import time and cold start to first prediction instead")
+    parser.add_argument('--out', default='bench.json', help="JSON results file")
+    args = parser.parse_args(argv)
+
+    size = tuple(args.size * 2)[:2]
+    target_size = (args.target_size, args.target_size)
+    if args.startup:
+        results = measure_startup(*args.startup)
+    elif args.compare_tta:
+        if not args.data_dir:
+            parser.error("--compare-tta needs --data-dir")
+        results = compare_tta(args.compare_tta, args.data_dir, target_size=target_size,
+                              batch_size=args.batch_size)
+    elif args.gradcam:
+        if not args.data_dir:
+            parser.error("--gradcam needs --data-dir")
+        results = measure_gradcam(args.gradcam, args.data_dir, target_size, args.batch_size)
+    elif args.compare_transfer:
+        results = compare_transfer(args.data_dir, args.count, size, target_size, args.batch_size, args.epochs,
+                                   args.backbone, args.backbone_weights, args.fine_tune_epochs)
+    elif args.compare_balancing:
+        results = compare_balancing(args.data_dir, args.count, size, target_size, args.batch_size,
+                                    args.epochs, args.target_ratio, args.keep_positive, not args.no_augment)
+    elif args.compare_training_modes:
+        results = compare_training_modes(args.data_dir, args.count, size, target_size,
+                                         args.batch_size, args.epochs)
+    elif args.compare_architectures:
+        results = compare_architectures(args.data_dir, args.count, size, target_size,
+                                        args.batch_size, args.epochs)
+    else:
+        results = run_benchmark(args.data_dir, args.count, size, target_size,
+                                args.batch_size, args.workers, not args.no_augment)
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+"""On-disk cache of resized images.
+
+Resized pixels are stored as uint8 .npy shards that are memory-mapped on load,
+and an index.json maps every source file to its (shard, row). An entry is
+reused while the file's mtime and size (or, optionally, its content hash) are
+unchanged, so a rerun only decodes new or modified scans: adding 50 scans to
+`yes/` costs 50 decodes and one new shard.
+
+Each TARGET_SIZE / resize filter combination gets its own sub-folder, so
+changing either never serves stale pixels.
+
+hashes() adds each image's perceptual hash (brain_tumor.dedup) to its
+entry, so the near-duplicate groups of the canonical split are recomputed
+only for new or changed files.
+
+With a single in-order shard, load() returns the memmap itself; with several
+it returns a ShardedImages view that reads the requested rows from each
+shard's memmap, so memory stays bounded either way. Loads hold an exclusive
+lock on the cache folder (fcntl, POSIX only), so worker processes opening
+the same cache at once decode each file only once and never see each
+other's half-updated index or shards.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError: # Windows: no inter-process locking
+    fcntl = None
+
+from .data import RESAMPLE, TARGET_SIZE, LoadReport, iter_item_batches, list_image_files
+
+INDEX_VERSION = 1
+MAX_SHARDS = 16 # compact into one shard past this many
+COPY_ROWS = 1024 # rows copied at a time when writing a shard from another array
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-1 of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ShardedImages:
+    """Read-only (N, H, W, 3) uint8 images spread over several memory-mapped shards.
+
+    Supports what the pipelines use on the image array: len, shape, dtype,
+    size, nbytes, row selection by integer, slice, index array or boolean mask (optionally
+    followed by more indices), and iteration. Only the selected rows are
+    read, shard by shard; np.asarray() copies everything.
+    """
+
+    def __init__(self, shards, shard_ids, rows):
+        self._shards = shards # shard -> memmap
+        self._shard_ids = shard_ids
+        self._rows = rows
+        first = next(iter(shards.values()))
+        self.shape = (len(rows),) + first.shape[1:]
+        self.dtype = first.dtype
+        self.ndim = len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        return self.size * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        rest = ()
+        if isinstance(key, tuple):
+            key, rest = key[0], key[1:]
+        if isinstance(key, (int, np.integer)):
+            return np.array(self._shards[self._shard_ids[key]][self._rows[key]])[rest]
+        if isinstance(key, slice):
+            selection = np.arange(*key.indices(len(self)))
+        else:
+            selection = np.asarray(key)
+            if selection.dtype == bool:
+                selection = np.flatnonzero(selection)
+        shard_ids, rows = self._shard_ids[selection], self._rows[selection]
+        out = np.empty((len(selection),) + self.shape[1:], dtype=self.dtype)
+        for shard in np.unique(shard_ids):
+            mask = shard_ids == shard
+            out[mask] = self._shards[shard][rows[mask]]
+        return out[(slice(None),) + rest] if rest else out
+
+    def __iter__(self):
+        for start in range(0, len(self), COPY_ROWS):
+            yield from self[start:start + COPY_ROWS]
+
+    def __array__(self, dtype=None, copy=None):
+        out = self[:]
+        return out if dtype is None else out.astype(dtype)
+
+
+class PreprocessedCache:
+    """Cache of resized uint8 images under `cache_dir`.
+
+    Usage:
+        cache = PreprocessedCache('/content/cache')
+        data, labels, paths, report = cache.load([no_tumor_path, yes_tumor_path])
+    """
+
+    def __init__(self, cache_dir, target_size=TARGET_SIZE, resample=RESAMPLE,
+                 hash_contents=False):
+        self.target_size = tuple(target_size)
+        self.resample = int(resample)
+        self.hash_contents = hash_contents
+        self.root = os.path.join(cache_dir, f"{self.target_size[0]}x{self.target_size[1]}_r{self.resample}")
+        self.index_path = os.path.join(self.root, 'index.json')
+        self._lock_depth = 0
+        os.makedirs(self.root, exist_ok=True)
+        self.index = self._read_index()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Exclusive inter-process lock on the cache folder (re-entrant within this object)."""
+        if fcntl is None or self._lock_depth:
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+            return
+        with open(os.path.join(self.root, '.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        empty = {'version': INDEX_VERSION, 'target_size': list(self.target_size),
+                 'resample': self.resample, 'next_shard': 0, 'entries': {}, 'failed': {}}
+        if not os.path.exists(self.index_path):
+            return empty
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring unreadable cache index {self.index_path}: {e}")
+            return empty
+        if index.get('version') != INDEX_VERSION:
+            return empty
+        return index
+
+    def _write_index(self):
+        # Per-process temp name: several workers may open the same warm cache at once
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path) # Atomic, a crash never leaves half an index
+
+    def _shard_path(self, shard):
+        return os.path.join(self.root, f"shard_{shard:05d}.npy")
+
+    def _write_shard(self, images):
+        shard = self.index['next_shard']
+        self.index['next_shard'] += 1
+        tmp_path = self._shard_path(shard) + '.tmp'
+        # Copied in chunks so a ShardedImages source is never materialized whole
+        out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=tuple(images.shape))
+        for start in range(0, len(images), COPY_ROWS):
+            out[start:start + COPY_ROWS] = images[start:start + COPY_ROWS]
+        out.flush()
+        del out
+        os.replace(tmp_path, self._shard_path(shard))
+        return shard
+
+    def _is_fresh(self, entry, stat, path):
+        if entry is None:
+            return False
+        if entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return True
+        # mtime changes on copies/touches; with hashing enabled identical bytes still hit
+        return self.hash_contents and entry.get('sha1') == file_digest(path)
+
+    def load(self, class_dirs, batch_size=256, num_workers=None, use_processes=False):
+        """Return (data, labels, paths, report) for the class folders.
+
+        `data` is uint8 with shape (N, H, W, 3). Cached rows are read through
+        memory maps; only new or changed files are decoded (in parallel) and
+        appended as a new shard. With several shards `data` is a ShardedImages
+        view over their memmaps rather than one array.
+        """
+        start = time.perf_counter()
+        with self._locked():
+            self.index = self._read_index() # Another process may have updated the cache since
+            report = LoadReport()
+            entries = self.index['entries']
+            failed = self.index['failed']
+            items = list_image_files(class_dirs)
+
+            misses = []
+            for path, label in items:
+                stat = os.stat(path)
+                entry = entries.get(path)
+                if self._is_fresh(failed.get(path), stat, path):
+                    # Unchanged corrupt file: report it again without another decode attempt
+                    print(f"Error: {failed[path]['error']}")
+                    report.skipped.append((path, failed[path]['error']))
+                elif self._is_fresh(entry, stat, path):
+                    entry['mtime_ns'], entry['size'], entry['label'] = stat.st_mtime_ns, stat.st_size, label
+                else:
+                    misses.append((path, label))
+
+            if misses:
+                print(f"Cache: decoding {len(misses)} new or changed images, {len(items) - len(misses)} cached.")
+                new_images, new_paths = [], []
+                for images, labels, paths in iter_item_batches(misses, self.target_size, batch_size,
+                                                               num_workers, use_processes, report,
+                                                               self.resample, normalize=False):
+                    new_images.append(images)
+                    new_paths.extend(zip(paths, labels.tolist()))
+                if new_images:
+                    shard = self._write_shard(np.concatenate(new_images))
+                    for row, (path, label) in enumerate(new_paths):
+                        stat = os.stat(path)
+                        entries[path] = {'shard': shard, 'row': row, 'label': label,
+                                         'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+                        if self.hash_contents:
+                            entries[path]['sha1'] = file_digest(path)
+                # Drop stale entries of files that no longer decode so they are not served
+                for path, error in report.skipped:
+                    entries.pop(path, None)
+                    stat = os.stat(path)
+                    failed[path] = {'error': error, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+            # Forget files that were deleted from (or fixed in) the dataset folders
+            present = {path for path, _ in items}
+            for path in [p for p in entries if p not in present]:
+                del entries[path]
+            for path in [p for p in failed if p not in present or p in entries]:
+                del failed[path]
+
+            if len(self._live_shards()) > MAX_SHARDS:
+                self.compact([p for p, _ in items])
+            self._remove_dead_shards()
+            self._write_index()
+
+            paths = [path for path, _ in items if path in entries]
+            data = self._gather(paths)
+            labels = np.array([entries[path]['label'] for path in paths], dtype=int)
+
+        report.cached = len(paths) - report.loaded # report.loaded only counted decodes so far
+        report.loaded = len(paths)
+        report.per_class = {int(k): int(v) for k, v in zip(*np.unique(labels, return_counts=True))}
+        report.wall_seconds = time.perf_counter() - start
+        return data, labels, paths, report
+
+    def hashes(self, paths):
+        """Perceptual dHash (uint64) of each cached path, kept in the index next to its entry.
+
+        Only paths without a stored hash (new or re-decoded files) are hashed.
+        """
+        from .dedup import dhash
+
+        with self._locked():
+            self.index = self._read_index()
+            entries = self.index['entries']
+            missing = [path for path in paths if 'dhash' not in entries[path]]
+            if missing:
+                for path, value in zip(missing, dhash(self._gather(missing))):
+                    entries[path]['dhash'] = f"{int(value):016x}"
+                self._write_index()
+            return np.array([int(entries[path]['dhash'], 16) for path in paths], dtype=np.uint64)
+
+    def _live_shards(self):
+        return sorted({entry['shard'] for entry in self.index['entries'].values()})
+
+    def _remove_dead_shards(self):
+        live = set(self._live_shards())
+        for name in os.listdir(self.root):
+            if name.startswith('shard_') and name.endswith('.npy'):
+                if int(name[len('shard_'):-len('.npy')]) not in live:
+                    os.remove(os.path.join(self.root, name))
+
+    def _gather(self, paths):
+        entries = self.index['entries']
+        shards = {shard: np.load(self._shard_path(shard), mmap_mode='r') for shard in self._live_shards()}
+        if not paths or not shards:
+            # Empty or missing class folders, or nothing decoded: same result as load_image_folders
+            return np.empty((0, self.target_size[1], self.target_size[0], 3), dtype=np.uint8)
+        if len(shards) == 1:
+            (shard, mm), = shards.items()
+            rows = np.array([entries[path]['row'] for path in paths], dtype=np.int64)
+            if len(rows) == len(mm) and np.array_equal(rows, np.arange(len(mm))):
+                return mm # Already in dataset order: hand out the memmap itself, zero copy
+        shard_ids = np.array([entries[path]['shard'] for path in paths], dtype=np.int64)
+        rows = np.array([entries[path]['row'] for path in paths], dtype=np.int64)
+        return ShardedImages(shards, shard_ids, rows)
+
+    def compact(self, paths=None):
+        """Rewrite all live rows into one shard in `paths` order (default: index order)."""
+        with self._locked():
+            if self._lock_depth == 1: # Not called from load(), which already re-read the index
+                self.index = self._read_index()
+            entries = self.index['entries']
+            paths = [p for p in (paths or list(entries)) if p in entries]
+            if not paths:
+                return
+            images = self._gather(paths)
+            shard = self._write_shard(images)
+            for row, path in enumerate(paths):
+                entries[path]['shard'], entries[path]['row'] = shard, row
+            self._remove_dead_shards()
+            self._write_index()
@@ -0,0 +1,173 @@
+"""Resumable training: periodic checkpoints and warm restart.
+
+TrainingCheckpoint is a Keras callback that saves, every `save_every`
+epochs, everything needed to continue a run where it stopped:
+
+- model weights and optimizer state (slots, iteration count, learning rate)
+- the number of completed epochs (the input pipeline restarts at that epoch)
+- EarlyStopping and ReduceLROnPlateau counters and best values
+- EarlyStopping's best weights, which otherwise only live in memory
+- the History so far, so curves can be plotted over the whole run
+
+The training thread only snapshots the variables to NumPy; a background
+thread writes epoch_XXXXX.npz plus checkpoint.json (atomically, like the
+preprocessed cache), so disk I/O never stalls a training step.
+
+    checkpoint = TrainingCheckpoint(CHECKPOINT_DIR, [early_stopping, reduce_lr])
+    initial_epoch = checkpoint.restore(model) # 0 on a fresh run
+    model.fit(..., initial_epoch=initial_epoch, callbacks=[early_stopping, reduce_lr, checkpoint])
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tensorflow as tf
+
+STATE_FILE = 'checkpoint.json'
+# Per-callback attributes that make up its resumable state
+CALLBACK_STATE = {
+    'EarlyStopping': ('wait', 'stopped_epoch', 'best', 'best_epoch'),
+    'ReduceLROnPlateau': ('wait', 'best', 'cooldown_counter'),
+}
+
+
+def _to_json(value):
+    if hasattr(value, 'item'): # NumPy / TF scalars
+        return value.item()
+    return value
+
+
+class TrainingCheckpoint(tf.keras.callbacks.Callback):
+    """Saves model, optimizer, epoch and callback state; restores them on restart.
+
+    The model must be compiled (the optimizer is part of the checkpoint).
+    `callbacks` are the stateful callbacks of the same fit() call; list this
+    callback after them. read_only=True restores and tracks the state but
+    never writes (the non-chief workers of a multi-worker run).
+    """
+
+    def __init__(self, directory, callbacks=(), save_every=1, max_to_keep=2, async_write=True,
+                 read_only=False):
+        super().__init__()
+        self.directory = directory
+        self.read_only = read_only
+        self.callbacks = list(callbacks)
+        self.save_every = save_every
+        self.max_to_keep = max_to_keep
+        self.history = {}
+        self.finished = False
+        self.save_seconds = [] # Time the training thread spent per save
+        self._executor = ThreadPoolExecutor(max_workers=1) if async_write else None
+        self._pending_write = None
+        self._pending_state = None
+        self._best_weights = None
+        self._last_epoch = self._saved_epoch = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def state_path(self):
+        return os.path.join(self.directory, STATE_FILE)
+
+    def restore(self, model):
+        """Load the latest checkpoint into `model`, if any; returns fit's initial_epoch.
+
+        Weights and optimizer state are restored immediately; callback state
+        at the start of the first resumed epoch (after the callbacks' own
+        on_train_begin resets).
+        """
+        if not os.path.exists(self.state_path):
+            return 0
+        start = time.perf_counter()
+        with open(self.state_path) as f:
+            state = json.load(f)
+        optimizer = model.optimizer
+        if not optimizer.built:
+            optimizer.build(model.trainable_variables)
+        if len(optimizer.variables) != state['num_optimizer_variables']:
+            raise ValueError(f"Checkpoint in {self.directory} has {state['num_optimizer_variables']} optimizer "
+                             f"variables, this optimizer has {len(optimizer.variables)}.")
+        with np.load(os.path.join(self.directory, state['arrays'])) as arrays:
+            model.set_weights([arrays[f"weight_{i}"] for i in range(state['num_weights'])])
+            for i, variable in enumerate(optimizer.variables):
+                variable.assign(arrays[f"optimizer_{i}"])
+            self._best_weights = [arrays[f"best_{i}"] for i in range(state['num_best_weights'])] or None
+        self.history = state['history']
+        self.finished = state['finished']
+        self._pending_state = state
+        epoch = self._last_epoch = self._saved_epoch = state['epoch']
+        print(f"Resumed from {self.state_path} (epoch {epoch}) in {time.perf_counter() - start:.2f}s"
+              + (" - early stopping had already ended this run" if self.finished else ""))
+        return epoch
+
+    def on_epoch_begin(self, epoch, logs=None):
+        if self._pending_state is not None:
+            for callback, values in zip(self.callbacks, self._pending_state['callbacks']):
+                for name, value in values.items():
+                    setattr(callback, name, value)
+                if hasattr(callback, 'best_weights') and self._best_weights is not None:
+                    callback.best_weights = self._best_weights
+            self._pending_state = None
+
+    def on_epoch_end(self, epoch, logs=None):
+        self._last_epoch = epoch + 1
+        for key, value in (logs or {}).items():
+            self.history.setdefault(key, []).append(_to_json(value))
+        if (epoch + 1) % self.save_every == 0:
+            self.save(epoch + 1)
+
+    def on_train_end(self, logs=None):
+        # Listed after EarlyStopping, this sees the restored best weights of a stopped run
+        if self.model.stop_training or self._saved_epoch != self._last_epoch:
+            self.save(self._last_epoch, finished=self.model.stop_training)
+        self.wait()
+
+    def save(self, epoch, finished=False):
+        """Snapshot the training state now; the files are written in the background."""
+        if self.read_only:
+            return
+        start = time.perf_counter()
+        self.wait() # At most one write in flight, so checkpoints land in order
+        arrays = {f"weight_{i}": w for i, w in enumerate(self.model.get_weights())}
+        arrays.update({f"optimizer_{i}": v.numpy() for i, v in enumerate(self.model.optimizer.variables)})
+        best_weights = next((c.best_weights for c in self.callbacks
+                             if getattr(c, 'best_weights', None) is not None), None) or []
+        arrays.update({f"best_{i}": np.asarray(w) for i, w in enumerate(best_weights)})
+        callbacks = [{name: _to_json(getattr(c, name)) for name in CALLBACK_STATE.get(type(c).__name__, ())
+                      if hasattr(c, name)} for c in self.callbacks]
+        state = {'epoch': epoch, 'finished': finished, 'arrays': f"epoch_{epoch:05d}.npz",
+                 'num_weights': len(self.model.weights),
+                 'num_optimizer_variables': len(self.model.optimizer.variables),
+                 'num_best_weights': len(best_weights), 'callbacks': callbacks,
+                 'history': {key: list(values) for key, values in self.history.items()}}
+        if self._executor is None:
+            self._write(arrays, state)
+        else:
+            self._pending_write = self._executor.submit(self._write, arrays, state)
+        self._saved_epoch = epoch
+        self.save_seconds.append(time.perf_counter() - start)
+
+    def wait(self):
+        """Block until the last background write has finished (re-raising its error)."""
+        if self._pending_write is not None:
+            self._pending_write.result()
+            self._pending_write = None
+
+    def _write(self, arrays, state):
+        # Temp file + os.replace: a crash mid-write never leaves a half checkpoint
+        arrays_path = os.path.join(self.directory, state['arrays'])
+        tmp_path = f"{arrays_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, arrays_path)
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+        # Keep the newest `max_to_keep` array files; checkpoint.json points at the newest
+        saved = sorted(name for name in os.listdir(self.directory)
+                       if name.startswith('epoch_') and name.endswith('.npz'))
+        for name in saved[:-self.max_to_keep]:
+            os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,200 @@
+"""Image loading for the brain tumor dataset.
+
+Replaces the two serial os.listdir/PIL loops of the notebook with one loader
+that decodes and resizes in a worker pool and yields batches in a stable order.
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+import numpy as np
+from PIL import Image
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+TARGET_SIZE = (128, 128)
+STAGES = ('decode', 'resize', 'normalize')
+# PIL's default filter for Image.resize, spelled out so caches can key on it
+RESAMPLE = Image.Resampling.BICUBIC
+
+
+def list_image_files(class_dirs):
+    """Return (path, label) pairs for every image in the class folders.
+
+    `class_dirs` is a list of folders, the label is the position in the list
+    (e.g. [no_tumor_path, yes_tumor_path] -> 0, 1). Files are sorted so the
+    order does not depend on the filesystem.
+    """
+    items = []
+    for label, folder in enumerate(class_dirs):
+        if not os.path.exists(folder):
+            print(f"Error: folder '{folder}' not found. Check path and contents.")
+            continue
+        for filename in sorted(os.listdir(folder)):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                items.append((os.path.join(folder, filename), label))
+    return items
+
+
+def load_image(img_path, target_size=TARGET_SIZE, resample=RESAMPLE, normalize=False):
+    """Decode and resize one image.
+
+    Returns (img_array, error, timings). img_array is None if the file could
+    not be processed; timings holds the seconds spent in each stage. Pixels
+    stay uint8 unless normalize=True, which returns float64 values in 0-1;
+    training normalizes per batch in the tf.data pipeline instead.
+    """
+    timings = dict.fromkeys(STAGES, 0.0)
+    try:
+        start = time.perf_counter()
+        img = Image.open(img_path).convert('RGB')
+        mid = time.perf_counter()
+        img = img.resize(target_size, resample)
+        end = time.perf_counter()
+        img_array = np.array(img)
+        if normalize:
+            img_array = img_array / 255.0 # Normalize pixel values to 0-1
+        timings['decode'] = mid - start
+        timings['resize'] = end - mid
+        timings['normalize'] = time.perf_counter() - end
+    except Exception as e:
+        return None, f"Could not process image {img_path}: {e}", timings
+
+    if img_array.shape != (target_size[1], target_size[0], 3):
+        return None, f"Skipping {img_path} due to unexpected shape: {img_array.shape}", timings
+    return img_array, None, timings
+
+
+def _load_chunk(paths, target_size, resample, normalize):
+    # Runs in the worker; one task per chunk keeps process pools cheap
+    return [load_image(path, target_size, resample, normalize) for path in paths]
+
+
+class LoadReport:
+    """Counters and per-stage timings collected while loading."""
+
+    def __init__(self):
+        self.loaded = 0
+        self.cached = 0 # images served from a PreprocessedCache instead of decoded
+        self.skipped = [] # (path, reason)
+        self.per_class = {}
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.wall_seconds = 0.0
+
+    def add(self, path, label, img_array, error, timings):
+        for stage, seconds in timings.items():
+            self.stage_seconds[stage] += seconds
+        if img_array is None:
+            self.skipped.append((path, error))
+            return
+        self.loaded += 1
+        self.per_class[label] = self.per_class.get(label, 0) + 1
+
+    def summary(self):
+        lines = [f"Loaded {self.loaded} images, skipped {len(self.skipped)} "
+                 f"in {self.wall_seconds:.2f}s wall time."]
+        if self.cached:
+            lines.append(f"  {self.cached} from cache, {self.loaded - self.cached} decoded")
+        for label in sorted(self.per_class):
+            lines.append(f"  class {label}: {self.per_class[label]} images")
+        # Stage times are summed over workers, so they can exceed wall time
+        for stage in STAGES:
+            lines.append(f"  {stage}: {self.stage_seconds[stage]:.2f}s")
+        if self.loaded:
+            lines.append(f"  throughput: {self.loaded / max(self.wall_seconds, 1e-9):.1f} images/sec")
+        return "\n".join(lines)
+
+
+def iter_image_batches(class_dirs, target_size=TARGET_SIZE, batch_size=256,
+                       num_workers=None, use_processes=False, report=None,
+                       resample=RESAMPLE, normalize=False):
+    """Yield (images, labels, paths) batches decoded by a worker pool.
+
+    Batches come out in the order of list_image_files(), whatever the number
+    of workers. Corrupt or oddly shaped files are skipped and recorded in
+    `report` (a LoadReport). Threads are the default since PIL releases the GIL
+    while decoding and resizing; set use_processes=True for pure-CPU hosts
+    where that is not enough.
+    """
+    yield from iter_item_batches(list_image_files(class_dirs), target_size, batch_size,
+                                 num_workers, use_processes, report, resample, normalize)
+
+
+def iter_item_batches(items, target_size=TARGET_SIZE, batch_size=256, num_workers=None,
+                      use_processes=False, report=None, resample=RESAMPLE, normalize=False,
+                      print_errors=True):
+    """Same as iter_image_batches() for an explicit list of (path, label) pairs.
+
+    `items` may also be any iterable (e.g. a generator over a huge directory);
+    it is consumed lazily, so memory stays bounded by the batches in flight.
+    With print_errors=False skipped files are only recorded in `report`.
+    """
+    report = report if report is not None else LoadReport()
+    num_workers = num_workers or os.cpu_count() or 1
+    executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    chunk_size = max(1, min(32, batch_size // num_workers or 1))
+    start = time.perf_counter()
+
+    with executor_cls(max_workers=num_workers) as executor:
+        items = iter(items)
+        exhausted = False
+        pending = deque()
+        images, labels, paths = [], [], []
+        # Keep a couple of batches in flight so workers never wait on the consumer
+        max_in_flight = max(2 * num_workers, 2 * batch_size // chunk_size)
+
+        while not exhausted or pending:
+            while not exhausted and len(pending) < max_in_flight:
+                chunk = list(islice(items, chunk_size))
+                if not chunk:
+                    exhausted = True
+                    break
+                future = executor.submit(_load_chunk, [p for p, _ in chunk],
+                                         target_size, resample, normalize)
+                pending.append((chunk, future))
+            if not pending:
+                break
+
+            chunk, future = pending.popleft()
+            for (path, label), (img_array, error, timings) in zip(chunk, future.result()):
+                report.add(path, label, img_array, error, timings)
+                if img_array is None:
+                    if print_errors:
+                        print(f"Error: {error}")
+                    continue
+                images.append(img_array)
+                labels.append(label)
+                paths.append(path)
+
+            if len(images) >= batch_size:
+                report.wall_seconds = time.perf_counter() - start
+                yield np.stack(images[:batch_size]), np.array(labels[:batch_size]), paths[:batch_size]
+                images, labels, paths = images[batch_size:], labels[batch_size:], paths[batch_size:]
+
+        report.wall_seconds = time.perf_counter() - start
+        if images:
+            yield np.stack(images), np.array(labels), paths
+
+
+def load_image_folders(class_dirs, target_size=TARGET_SIZE, batch_size=256,
+                       num_workers=None, use_processes=False):
+    """Load every image of the class folders into one uint8 array.
+
+    Returns (data, labels, paths, report), the in-memory equivalent of the
+    notebook's `data` / `labels` lists. Batches are written straight into a
+    preallocated array, so peak memory is the uint8 dataset plus one batch.
+    """
+    report = LoadReport()
+    items = list_image_files(class_dirs)
+    data = np.empty((len(items), target_size[1], target_size[0], 3), dtype=np.uint8)
+    labels = np.empty((len(items),), dtype=int)
+    paths = []
+    for images, batch_labels, batch_paths in iter_item_batches(items, target_size, batch_size,
+                                                               num_workers, use_processes, report):
+        data[len(paths):len(paths) + len(images)] = images
+        labels[len(paths):len(paths) + len(images)] = batch_labels
+        paths.extend(batch_paths)
+    # Skipped files leave unused rows at the end; slicing drops them without a copy
+    return data[:len(paths)], labels[:len(paths)], paths, report
@@ -0,0 +1,226 @@
+"""Duplicate and near-duplicate scan detection.
+
+Every image gets a 64-bit perceptual difference hash (dHash: is each pixel
+of a 9x8 grayscale thumbnail brighter than its right neighbour), so copies,
+re-encodes and slightly resized or brightened versions of a scan land
+within a few bits of each other.
+
+Near-duplicate search uses multi-index hashing instead of comparing all
+pairs: the hash is cut into max_distance + 1 chunks, and two hashes within
+max_distance bits must agree exactly on at least one chunk (pigeonhole). So
+only images sharing a chunk value are compared, which keeps 100k+ images
+far below the O(n^2) pairwise cost.
+
+    groups = duplicate_groups(dhash(data), max_distance=4)
+    train_idx, val_idx, test_idx = split_indices(labels, groups=groups) # A group never spans splits
+    keep = first_of_each_group(groups)                                  # ... or drop the copies
+
+dataset_split() is the one place that turns a dataset into its canonical
+train/validation/test split (dedup='group' by default, as in the notebook):
+training, evaluation, export, search, TFRecord export and the benchmarks
+all call it, so the test split really is unseen wherever it is used. With a
+PreprocessedCache the hashes are kept in its index, so they are computed
+once per file.
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8 # 8x8 comparisons -> 64-bit hash
+MAX_DISTANCE = 4 # Hamming distance (of 64 bits) still counted as the same scan
+LARGE_BUCKET = 2048 # Above this many members a bucket is compared row by row
+DEDUP_MODES = ('group', 'drop', None)
+DEDUP = 'group' # Default handling of near-duplicates when splitting
+
+
+def dhash(images, hash_size=HASH_SIZE):
+    """Difference hashes (uint64) of uint8 images (N, H, W, 3) or (N, H, W)."""
+    hashes = np.empty(len(images), dtype=np.uint64)
+    weights = (np.uint64(1) << np.arange(hash_size * hash_size, dtype=np.uint64))
+    for i, image in enumerate(images):
+        thumb = Image.fromarray(np.asarray(image)).convert('L').resize((hash_size + 1, hash_size),
+                                                                       Image.Resampling.BOX)
+        pixels = np.asarray(thumb, dtype=np.int16)
+        bits = (pixels[:, 1:] > pixels[:, :-1]).reshape(-1)
+        hashes[i] = np.bitwise_or.reduce(weights[bits]) if bits.any() else np.uint64(0)
+    return hashes
+
+
+def hamming_distance(a, b):
+    """Bitwise Hamming distance between uint64 arrays (broadcasting)."""
+    x = np.bitwise_xor(np.asarray(a, dtype=np.uint64), np.asarray(b, dtype=np.uint64))
+    # Popcount via the byte view
+    bits = np.unpackbits(np.ascontiguousarray(x).reshape(-1).view(np.uint8).reshape(-1, 8), axis=-1)
+    return bits.sum(axis=-1).reshape(x.shape)
+
+
+class HashIndex:
+    """Multi-index over 64-bit hashes for radius-`max_distance` Hamming search."""
+
+    def __init__(self, hashes, max_distance=MAX_DISTANCE):
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+        self.max_distance = max_distance
+        chunks = max_distance + 1
+        bounds = np.linspace(0, 64, chunks + 1).astype(int)
+        self.chunk_bits = list(zip(bounds[:-1], bounds[1:]))
+        # Per chunk: image ids sorted by chunk value, plus the sorted values for searchsorted
+        self.tables = []
+        for start, stop in self.chunk_bits:
+            keys = self._chunk(self.hashes, start, stop)
+            order = np.argsort(keys, kind='stable')
+            self.tables.append((keys[order], order))
+
+    @staticmethod
+    def _chunk(hashes, start, stop):
+        mask = np.uint64((1 << (stop - start)) - 1)
+        return (hashes >> np.uint64(start)) & mask
+
+    def query(self, hash_value):
+        """Ids of indexed hashes within max_distance of `hash_value`."""
+        candidates = []
+        for (start, stop), (keys, ids) in zip(self.chunk_bits, self.tables):
+            key = self._chunk(np.array([hash_value], dtype=np.uint64), start, stop)[0]
+            lo, hi = np.searchsorted(keys, key, 'left'), np.searchsorted(keys, key, 'right')
+            candidates.append(ids[lo:hi])
+        candidates = np.unique(np.concatenate(candidates))
+        return candidates[hamming_distance(self.hashes[candidates], hash_value) <= self.max_distance]
+
+    def pairs(self):
+        """(i, j) id pairs (i < j) within max_distance of each other."""
+        found = []
+        for keys, ids in self.tables:
+            # Runs of equal chunk value are the buckets; compare only within them
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            sizes = np.diff(np.r_[starts, len(keys)])
+            for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+                members = ids[start:start + size]
+                if size <= LARGE_BUCKET:
+                    i, j = np.triu_indices(size, k=1)
+                    close = hamming_distance(self.hashes[members[i]], self.hashes[members[j]]) <= self.max_distance
+                    found.append(np.stack([members[i][close], members[j][close]], axis=1))
+                    continue
+                for k in range(size - 1): # Row by row keeps memory O(size) for huge buckets
+                    rest = members[k + 1:]
+                    close = rest[hamming_distance(self.hashes[rest], self.hashes[members[k]]) <= self.max_distance]
+                    found.append(np.stack([np.full(len(close), members[k]), close], axis=1))
+        if not found:
+            return np.empty((0, 2), dtype=np.int64)
+        pairs = np.concatenate(found)
+        pairs.sort(axis=1)
+        return np.unique(pairs, axis=0)
+
+
+def duplicate_groups(hashes, max_distance=MAX_DISTANCE):
+    """Group id per image; near-duplicates (transitively) share one id, singletons get their own."""
+    parent = np.arange(len(hashes))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in HashIndex(hashes, max_distance).pairs():
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+    roots = np.array([find(i) for i in range(len(hashes))], dtype=np.int64)
+    return np.unique(roots, return_inverse=True)[1] # Dense 0..G-1 ids
+
+
+def first_of_each_group(groups):
+    """Indices keeping the first image of every group (drop the duplicates)."""
+    _, first = np.unique(groups, return_index=True)
+    return np.sort(first)
+
+
+def duplicate_report(groups, labels, paths=None):
+    """Summary of the duplicate groups: counts, and groups whose copies disagree on the label."""
+    ids, sizes = np.unique(groups, return_counts=True)
+    report = {'images': int(len(groups)), 'groups': int(len(ids)),
+              'duplicate_groups': int((sizes > 1).sum()), 'redundant_images': int((sizes - 1).sum())}
+    conflicts = []
+    for group in ids[sizes > 1]:
+        members = np.flatnonzero(groups == group)
+        if len(np.unique(labels[members])) > 1:
+            conflicts.append([paths[m] if paths is not None else int(m) for m in members])
+    report['label_conflicts'] = conflicts
+    return report
+
+
+def _print_report(report, max_distance):
+    print(f"Duplicates: {report['redundant_images']} near-duplicate images in {report['duplicate_groups']} "
+          f"groups ({report['images']} images, distance <= {max_distance}); "
+          f"{len(report['label_conflicts'])} groups with conflicting labels.")
+
+
+def grouped_split(labels, groups=None, dedup=DEDUP):
+    """(train_idx, val_idx, test_idx) with near-duplicates handled per `dedup`.
+
+    'group' keeps every group of near-duplicate scans (`groups`, from
+    duplicate_groups) in a single split, 'drop' keeps only the first image
+    of each group, None (or 'none') ignores duplicates and needs no groups.
+    Proportions and seeds are those of split_indices().
+    """
+    from .pipeline import split_indices
+
+    labels = np.asarray(labels)
+    dedup = None if dedup == 'none' else dedup
+    if dedup not in DEDUP_MODES:
+        raise ValueError(f"Unknown dedup mode {dedup!r}, expected one of {DEDUP_MODES}")
+    if dedup is None:
+        return split_indices(labels)
+    if dedup == 'drop':
+        keep = first_of_each_group(groups)
+        return tuple(keep[split] for split in split_indices(labels[keep]))
+    return split_indices(labels, groups=groups)
+
+
+def dataset_split(data, labels, paths=None, cache=None, dedup=DEDUP, max_distance=MAX_DISTANCE, verbose=True):
+    """The canonical split of a loaded dataset (see grouped_split).
+
+    With `cache` (the PreprocessedCache that returned data/paths) the hashes
+    come from its index and are computed only for new files; otherwise they
+    are computed from `data`.
+    """
+    groups = None
+    if dedup not in (None, 'none'):
+        groups = duplicate_groups(cache.hashes(paths) if cache is not None else dhash(data), max_distance)
+        if verbose:
+            _print_report(duplicate_report(groups, np.asarray(labels)), max_distance)
+    return grouped_split(labels, groups, dedup)
+
+
+def add_split_arguments(parser):
+    """--dedup / --dedup-distance options for command lines that split the dataset."""
+    parser.add_argument('--dedup', choices=('group', 'drop', 'none'), default=DEDUP,
+                        help="near-duplicate handling in the train/val/test split (default: %(default)s)")
+    parser.add_argument('--dedup-distance', type=int, default=MAX_DISTANCE,
+                        help="max Hamming distance (of 64 bits) counted as the same scan")
+
+
+def find_duplicates(data, labels, paths=None, max_distance=MAX_DISTANCE, out_path=None):
+    """Hash `data`, group near-duplicates and print a summary; returns (groups, hashes, report).
+
+    With out_path, the hashes and groups are saved as JSON next to the paths
+    for inspection.
+    """
+    start = time.perf_counter()
+    hashes = dhash(data)
+    hashed = time.perf_counter()
+    groups = duplicate_groups(hashes, max_distance)
+    report = duplicate_report(groups, np.asarray(labels), paths)
+    report.update(hash_seconds=hashed - start, group_seconds=time.perf_counter() - hashed)
+    _print_report(report, max_distance)
+    if out_path:
+        os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+        with open(out_path, 'w') as f:
+            json.dump({'report': report, 'max_distance': max_distance,
+                       'images': [{'path': paths[i] if paths is not None else i, 'hash': f"{int(h):016x}",
+                                   'group': int(g)} for i, (h, g) in enumerate(zip(hashes, groups))]},
+                      f, indent=1)
+    return groups, hashes, report
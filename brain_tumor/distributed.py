@@ -0,0 +1,362 @@
+"""Data-parallel training with tf.distribute.MultiWorkerMirroredStrategy.
+
+Every worker is one process holding a full model replica; gradients are
+all-reduced each step. Each worker builds the same seeded sequence of global
+batches and keeps only its slice of every batch (make_dataset(shard=...)),
+so the workers together take exactly the steps a single process would with
+the same global batch size, and each process only reads its own rows of the
+uint8 data (ideally a shared PreprocessedCache memmap).
+
+The training loop keeps the notebook's fit() behaviour: validation loss and
+accuracy every epoch (each worker evaluates its slice of every validation
+batch, summed across workers), EarlyStopping with restored best weights,
+ReduceLROnPlateau and, with --checkpoint-dir, a TrainingCheckpoint that all
+workers restore from and only the chief writes (on several hosts it must be
+a shared folder). All workers get the same reduced logs, so they stop and
+lower the learning rate together.
+
+Augmentation is seeded by (seed, global step) and drawn for the whole global
+batch before each worker takes its slice, so every number of workers trains
+on the same augmented batches, also after a resume. Dropout masks are
+seeded by the global step as well, so a run is reproducible, but they are
+drawn per worker batch: the masks, and hence the losses, differ slightly
+between worker counts (dropout=0 makes the runs match).
+
+Local launcher (N worker processes on this machine):
+
+    python -m brain_tumor.distributed launch --workers 4 --data-dir "NN Dataset" \\
+        --cache-dir /tmp/cache --epochs 30 --model-out brain_tumor.keras
+
+Several hosts: run the same worker command on every host, with the same
+--cluster list and that host's --index:
+
+    python -m brain_tumor.distributed worker --cluster h1:2222,h2:2222 --index 0 ...
+
+Scaling numbers on synthetic data:
+
+    python -m brain_tumor.distributed scaling --workers 1 2 4 8 --out scaling.json
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from .dedup import DEDUP, MAX_DISTANCE, add_split_arguments, dataset_split
+
+PACKAGE_PARENT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Callback settings of the notebook's fit()
+PATIENCE = 10
+LR_PATIENCE = 5
+LR_FACTOR = 0.5
+MIN_LR = 1e-6
+
+
+def run_worker(cluster, index, data_dir, cache_dir=None, epochs=5, batch_size=128, seed=42,
+               architecture='flatten', augment=True, target_size=(128, 128), threads=None,
+               model_out=None, report_out=None, dropout=0.6, dedup=DEDUP, max_distance=MAX_DISTANCE,
+               patience=PATIENCE, lr_patience=LR_PATIENCE, lr_factor=LR_FACTOR, min_lr=MIN_LR,
+               checkpoint_dir=None):
+    """Train as worker `index` of `cluster` (list of host:port); worker 0 is the chief.
+
+    Every worker computes the same canonical split (dedup.dataset_split); with
+    a shared cache the hashes are computed once and read from its index.
+    """
+    os.environ['TF_CONFIG'] = json.dumps({'cluster': {'worker': list(cluster)},
+                                          'task': {'type': 'worker', 'index': index}})
+    import tensorflow as tf
+
+    from .augment import augment_batch
+    from .cache import PreprocessedCache
+    from .checkpoint import TrainingCheckpoint
+    from .data import load_image_folders
+    from .model import build_model, compile_model
+    from .pipeline import make_dataset
+    from .train import EpochTimeLogger
+
+    if threads:
+        # Several workers on one machine should split the cores, not all claim them
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(max(1, threads // 2))
+    strategy = tf.distribute.MultiWorkerMirroredStrategy()
+    num_workers = strategy.num_replicas_in_sync
+
+    class_dirs = [os.path.join(data_dir, 'no'), os.path.join(data_dir, 'yes')]
+    cache = PreprocessedCache(cache_dir, target_size) if cache_dir else None
+    if cache is not None:
+        data, labels, paths, _ = cache.load(class_dirs)
+    else:
+        data, labels, paths, _ = load_image_folders(class_dirs, target_size)
+    train_idx, val_idx, _ = dataset_split(data, labels, paths, cache, dedup, max_distance, verbose=index == 0)
+    if batch_size % num_workers:
+        raise ValueError(f"Global batch size {batch_size} must be divisible by {num_workers} workers.")
+    steps_per_epoch = len(train_idx) // batch_size
+
+    tf.keras.utils.set_random_seed(seed) # Same initial weights as a single-process run
+    with strategy.scope():
+        model = compile_model(build_model(data.shape[1:], architecture=architecture, dropout=dropout))
+        optimizer = model.optimizer
+        early_stopping = tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=patience,
+                                                          restore_best_weights=True)
+        reduce_lr = tf.keras.callbacks.ReduceLROnPlateau(monitor='val_loss', factor=lr_factor, patience=lr_patience,
+                                                         min_lr=min_lr, verbose=int(index == 0))
+        checkpoint = None
+        initial_epoch = 0
+        if checkpoint_dir:
+            # Every worker restores; only the chief writes
+            checkpoint = TrainingCheckpoint(checkpoint_dir, [early_stopping, reduce_lr], read_only=index != 0)
+            initial_epoch = checkpoint.restore(model)
+    start_step = int(optimizer.iterations.numpy()) # Resumed runs continue the augmentation seeds
+    # Seed state of every Dropout layer (a layer with rate 0 has none)
+    seed_states = [layer.seed_generator.state for layer in model.layers
+                   if isinstance(layer, tf.keras.layers.Dropout) and getattr(layer, 'seed_generator', None)]
+
+    def train_fn(input_context):
+        # Same seed on every worker -> same global batches; each keeps its slice
+        shard = (input_context.input_pipeline_id, input_context.num_input_pipelines)
+        dataset = make_dataset(data, labels, train_idx, batch_size, shuffle=True, seed=seed, shard=shard,
+                               drop_remainder=True).repeat()
+        if augment:
+            # Transforms seeded by (seed, global step) and drawn for the global batch: the same
+            # augmented images whatever the number of workers
+            steps = tf.data.Dataset.counter(start_step)
+            dataset = tf.data.Dataset.zip(steps, dataset).map(
+                lambda step, batch: augment_batch(*batch, seed=tf.stack([tf.cast(seed, tf.int64), step]),
+                                                  shard=shard),
+                num_parallel_calls=tf.data.AUTOTUNE)
+        return dataset.prefetch(tf.data.AUTOTUNE)
+
+    def val_fn(input_context):
+        return make_dataset(data, labels, val_idx, batch_size,
+                            shard=(input_context.input_pipeline_id, input_context.num_input_pipelines))
+
+    train_iterator = iter(strategy.distribute_datasets_from_function(train_fn))
+    val_dataset = strategy.distribute_datasets_from_function(val_fn)
+
+    # Explicit loop: Keras 3's fit() cannot take multi-worker datasets (it fails reducing the
+    # first batch while building), so this is the standard strategy.run training step instead
+    @tf.function
+    def train_step(iterator):
+        def step_fn(images, labels):
+            for state in seed_states:
+                # Dropout masks follow the global step too (the layer keeps its own seed)
+                state.assign(tf.stack([state[0], tf.cast(optimizer.iterations, state.dtype)]))
+            with tf.GradientTape() as tape:
+                predictions = model(images, training=True)
+                per_example = tf.keras.losses.binary_crossentropy(labels[:, None], predictions)
+                # Mean over the *global* batch; the optimizer sums gradients across workers
+                loss = tf.nn.compute_average_loss(per_example, global_batch_size=batch_size)
+                loss += tf.nn.scale_regularization_loss(tf.add_n(model.losses))
+            gradients = tape.gradient(loss, model.trainable_variables)
+            optimizer.apply_gradients(zip(gradients, model.trainable_variables))
+            return loss
+        per_replica_loss = strategy.run(step_fn, args=next(iterator))
+        return strategy.reduce(tf.distribute.ReduceOp.SUM, per_replica_loss, axis=None)
+
+    @tf.function
+    def val_step(images, labels):
+        def step_fn(images, labels):
+            probabilities = tf.cast(model(images, training=False), tf.float32)
+            loss = tf.reduce_sum(tf.keras.losses.binary_crossentropy(labels[:, None], probabilities))
+            correct = tf.reduce_sum(tf.cast(tf.equal(tf.cast(probabilities[:, 0] > 0.5, tf.float32), labels),
+                                            tf.float32))
+            return loss, correct
+        per_replica = strategy.run(step_fn, args=(images, labels))
+        return [strategy.reduce(tf.distribute.ReduceOp.SUM, value, axis=None) for value in per_replica]
+
+    def evaluate():
+        loss, correct = 0.0, 0.0
+        for images, labels in val_dataset:
+            batch_loss, batch_correct = val_step(images, labels)
+            loss += float(batch_loss)
+            correct += float(batch_correct)
+        # Like Keras' val_loss: mean cross-entropy plus the regularization terms
+        regularization = float(tf.add_n(model.losses)) if model.losses else 0.0
+        return {'val_loss': loss / len(val_idx) + regularization, 'val_accuracy': correct / len(val_idx)}
+
+    timer = EpochTimeLogger(f"worker {index}/{num_workers}")
+    callbacks = tf.keras.callbacks.CallbackList(
+        [early_stopping, reduce_lr, timer] + ([checkpoint] if checkpoint else []), model=model)
+    model.stop_training = False
+    history = {}
+    callbacks.on_train_begin()
+    for epoch in range(initial_epoch, 0 if checkpoint and checkpoint.finished else epochs):
+        callbacks.on_epoch_begin(epoch)
+        total = sum(float(train_step(train_iterator)) for _ in range(steps_per_epoch))
+        logs = {'loss': total / max(steps_per_epoch, 1), **evaluate(),
+                'learning_rate': float(optimizer.learning_rate.numpy())}
+        callbacks.on_epoch_end(epoch, logs) # Every worker sees the same reduced logs, so all stop together
+        for key, value in logs.items():
+            history.setdefault(key, []).append(value)
+        if model.stop_training:
+            break
+    callbacks.on_train_end()
+
+    if index == 0:
+        if model_out:
+            model.save(model_out)
+        steady = timer.epoch_seconds[1:] or timer.epoch_seconds
+        report = {'workers': num_workers, 'global_batch_size': batch_size, 'steps_per_epoch': steps_per_epoch,
+                  'epoch_seconds': timer.epoch_seconds,
+                  'steady_epoch_seconds': sum(steady) / len(steady) if steady else None,
+                  'images_per_sec': steps_per_epoch * batch_size * len(steady) / sum(steady) if steady else None,
+                  'loss': history.get('loss', []), 'history': history,
+                  'stopped_epoch': early_stopping.stopped_epoch or None}
+        if report_out:
+            with open(report_out, 'w') as f:
+                json.dump(report, f, indent=2)
+        return report
+    return None
+
+
+def _free_ports(count, host='localhost'):
+    sockets = []
+    for _ in range(count):
+        sock = socket.socket()
+        sock.bind((host, 0))
+        sockets.append(sock)
+    ports = [sock.getsockname()[1] for sock in sockets]
+    for sock in sockets:
+        sock.close()
+    return ports
+
+
+def launch_local(num_workers, worker_args, host='localhost', threads_per_worker=None):
+    """Start `num_workers` worker processes on this machine and wait for them all."""
+    cluster = ','.join(f"{host}:{port}" for port in _free_ports(num_workers, host))
+    threads = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [PACKAGE_PARENT, env.get('PYTHONPATH')]))
+    processes = [
+        subprocess.Popen([sys.executable, '-m', 'brain_tumor.distributed', 'worker',
+                          '--cluster', cluster, '--index', str(index),
+                          '--threads', str(threads), *worker_args], env=env)
+        for index in range(num_workers)
+    ]
+    failed = [index for index, process in enumerate(processes) if process.wait() != 0]
+    if failed:
+        raise RuntimeError(f"Workers {failed} exited with an error.")
+
+
+def _add_training_args(parser):
+    parser.add_argument('--data-dir', required=True, help="dataset folder with no/ and yes/")
+    parser.add_argument('--cache-dir', help="PreprocessedCache folder shared by the workers")
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--batch-size', type=int, default=128, help="global batch size")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--architecture', default='flatten')
+    parser.add_argument('--dropout', type=float, default=0.6)
+    parser.add_argument('--no-augment', action='store_true')
+    parser.add_argument('--target-size', type=int, default=128)
+    parser.add_argument('--patience', type=int, default=PATIENCE, help="EarlyStopping patience (epochs)")
+    parser.add_argument('--lr-patience', type=int, default=LR_PATIENCE, help="ReduceLROnPlateau patience")
+    parser.add_argument('--lr-factor', type=float, default=LR_FACTOR)
+    parser.add_argument('--checkpoint-dir', help="TrainingCheckpoint folder, shared by the workers")
+    add_split_arguments(parser)
+
+
+def _training_args(args):
+    worker_args = ['--data-dir', args.data_dir, '--epochs', str(args.epochs),
+                   '--batch-size', str(args.batch_size), '--seed', str(args.seed),
+                   '--architecture', args.architecture, '--dropout', str(args.dropout),
+                   '--target-size', str(args.target_size), '--dedup', args.dedup,
+                   '--dedup-distance', str(args.dedup_distance), '--patience', str(args.patience),
+                   '--lr-patience', str(args.lr_patience), '--lr-factor', str(args.lr_factor)]
+    if args.checkpoint_dir:
+        worker_args += ['--checkpoint-dir', os.path.abspath(args.checkpoint_dir)]
+    if args.cache_dir:
+        worker_args += ['--cache-dir', args.cache_dir]
+    if args.no_augment:
+        worker_args.append('--no-augment')
+    return worker_args
+
+
+def scaling_benchmark(worker_counts=(1, 2, 4, 8), count_per_class=256, size=(256, 256),
+                      epochs=3, batch_size=128, architecture='flatten'):
+    """Steady-state epoch time and images/sec for each number of local workers."""
+    from .bench import write_synthetic_dataset
+    from .cache import PreprocessedCache
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='brain_tumor_dist_') as tmp:
+        data_dir = os.path.join(tmp, 'data')
+        cache_dir = os.path.join(tmp, 'cache')
+        class_dirs = write_synthetic_dataset(data_dir, count_per_class, size)
+        cache = PreprocessedCache(cache_dir)
+        _, _, paths, _ = cache.load(class_dirs) # Decode and hash once; workers memmap the cache
+        cache.hashes(paths)
+        for workers in worker_counts:
+            report_path = os.path.join(tmp, f"report_{workers}.json")
+            args = ['--data-dir', data_dir, '--cache-dir', cache_dir, '--epochs', str(epochs),
+                    '--batch-size', str(batch_size), '--architecture', architecture,
+                    '--report-out', report_path]
+            start = time.perf_counter()
+            launch_local(workers, args)
+            with open(report_path) as f:
+                results[workers] = json.load(f)
+            results[workers]['wall_seconds'] = time.perf_counter() - start
+    base = results[min(results)]['images_per_sec']
+    for workers, row in results.items():
+        row['speedup'] = row['images_per_sec'] / base
+        print(f"{workers} workers: {row['steady_epoch_seconds']:.2f} s/epoch, "
+              f"{row['images_per_sec']:.1f} images/sec, x{row['speedup']:.2f}")
+    return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'cpu_count': os.cpu_count(),
+            'config': {'count_per_class': count_per_class, 'epochs': epochs,
+                       'batch_size': batch_size, 'architecture': architecture},
+            'results': {str(k): v for k, v in results.items()}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-worker data-parallel training.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    worker = commands.add_parser('worker', help="run one worker (one per host or local process)")
+    worker.add_argument('--cluster', required=True, help="comma-separated host:port of every worker")
+    worker.add_argument('--index', type=int, required=True, help="this worker's position in --cluster")
+    worker.add_argument('--threads', type=int, default=None, help="intra-op threads for this worker")
+    worker.add_argument('--model-out', help="where the chief saves the trained model (.keras)")
+    worker.add_argument('--report-out', help="where the chief writes epoch times (JSON)")
+    _add_training_args(worker)
+
+    launch = commands.add_parser('launch', help="start N local workers")
+    launch.add_argument('--workers', type=int, default=2)
+    launch.add_argument('--model-out', help="trained model path (.keras)")
+    launch.add_argument('--report-out', help="epoch times (JSON)")
+    _add_training_args(launch)
+
+    scaling = commands.add_parser('scaling', help="synthetic-data scaling benchmark")
+    scaling.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    scaling.add_argument('--count', type=int, default=256, help="synthetic images per class")
+    scaling.add_argument('--epochs', type=int, default=3)
+    scaling.add_argument('--batch-size', type=int, default=128)
+    scaling.add_argument('--architecture', default='flatten')
+    scaling.add_argument('--out', default='scaling.json')
+
+    args = parser.parse_args(argv)
+    if args.command == 'worker':
+        run_worker(args.cluster.split(','), args.index, args.data_dir, args.cache_dir, args.epochs,
+                   args.batch_size, args.seed, args.architecture, not args.no_augment,
+                   (args.target_size, args.target_size), args.threads, args.model_out, args.report_out,
+                   args.dropout, args.dedup, args.dedup_distance, args.patience, args.lr_patience,
+                   args.lr_factor, checkpoint_dir=args.checkpoint_dir)
+    elif args.command == 'launch':
+        extra = []
+        if args.model_out:
+            extra += ['--model-out', os.path.abspath(args.model_out)]
+        if args.report_out:
+            extra += ['--report-out', os.path.abspath(args.report_out)]
+        launch_local(args.workers, _training_args(args) + extra)
+    else:
+        results = scaling_benchmark(args.workers, args.count, epochs=args.epochs,
+                                    batch_size=args.batch_size, architecture=args.architecture)
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
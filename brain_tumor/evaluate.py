@@ -0,0 +1,200 @@
+"""Single-pass, vectorized evaluation.
+
+One batched pass over a dataset collects the predicted probabilities; loss,
+accuracy, the classification report, the confusion matrix, ROC/AUC and a
+threshold sweep are then all computed from them with NumPy, instead of
+running model.evaluate and model.predict over the same data.
+
+For test sets too large to keep as one array, Evaluator(bins=...) keeps only
+per-class probability histograms (plus exact counts at the decision
+threshold), so memory is O(bins) whatever the number of images.
+"""
+
+import numpy as np
+
+CLASS_NAMES = ('No Tumor', 'Yes Tumor')
+THRESHOLD = 0.5
+EPSILON = 1e-7 # Same clipping as Keras' binary_crossentropy
+SWEEP_THRESHOLDS = np.linspace(0.0, 1.0, 101)
+
+
+def _rates(tp, fp, positives, negatives):
+    """Vectorized metrics from true/false-positive counts at each threshold."""
+    fn = positives - tp
+    tn = negatives - fp
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tpr = np.where(positives > 0, tp / max(positives, 1), 0.0)
+        fpr = np.where(negatives > 0, fp / max(negatives, 1), 0.0)
+        precision = np.where(tp + fp > 0, tp / np.maximum(tp + fp, 1), 1.0)
+        f1 = np.where(precision + tpr > 0, 2 * precision * tpr / np.maximum(precision + tpr, 1e-12), 0.0)
+    accuracy = (tp + tn) / max(positives + negatives, 1)
+    return {'tpr': tpr, 'fpr': fpr, 'precision': precision, 'f1': f1, 'accuracy': accuracy,
+            'tp': tp, 'fp': fp, 'fn': fn, 'tn': tn}
+
+
+class Evaluator:
+    """Accumulates (labels, probabilities) batches and computes every metric at the end.
+
+    bins=None keeps the probabilities (exact ROC, fine for normal test sets);
+    bins=N keeps two N-bin histograms instead (streaming, O(N) memory; ROC/AUC
+    and the sweep are then resolved to 1/N).
+    """
+
+    def __init__(self, threshold=THRESHOLD, bins=None, regularization_loss=0.0):
+        self.threshold = threshold
+        self.bins = bins
+        self.regularization_loss = regularization_loss
+        self.count = 0
+        self.loss_sum = 0.0
+        self.confusion = np.zeros((2, 2), dtype=np.int64) # [actual, predicted] at `threshold`
+        if bins is None:
+            self._labels, self._probabilities = [], []
+        else:
+            self.histograms = np.zeros((2, bins), dtype=np.int64)
+
+    def update(self, labels, probabilities):
+        labels = np.asarray(labels).reshape(-1).astype(np.int64)
+        probabilities = np.asarray(probabilities, dtype=np.float64).reshape(-1)
+        clipped = np.clip(probabilities, EPSILON, 1.0 - EPSILON)
+        self.loss_sum += float(-np.sum(labels * np.log(clipped) + (1 - labels) * np.log(1.0 - clipped)))
+        self.count += len(labels)
+        predicted = (probabilities > self.threshold).astype(np.int64)
+        self.confusion += np.bincount(2 * labels + predicted, minlength=4).reshape(2, 2)
+        if self.bins is None:
+            self._labels.append(labels)
+            self._probabilities.append(probabilities)
+        else:
+            index = np.minimum((probabilities * self.bins).astype(np.int64), self.bins - 1)
+            for label in (0, 1):
+                self.histograms[label] += np.bincount(index[labels == label], minlength=self.bins)
+
+    @property
+    def labels(self):
+        return np.concatenate(self._labels) if self.bins is None and self._labels else np.empty(0)
+
+    @property
+    def probabilities(self):
+        return np.concatenate(self._probabilities) if self.bins is None and self._probabilities else np.empty(0)
+
+    def _counts_at(self, thresholds):
+        """True/false positives (probability > t) for each threshold t."""
+        if self.bins is None:
+            labels, probabilities = self.labels, self.probabilities
+            positives = np.sort(probabilities[labels == 1])
+            negatives = np.sort(probabilities[labels == 0])
+            tp = len(positives) - np.searchsorted(positives, thresholds, side='right')
+            fp = len(negatives) - np.searchsorted(negatives, thresholds, side='right')
+            return tp, fp
+        # Histogram bin i covers [i/bins, (i+1)/bins); count the bins starting at or above t, as
+        # _roc() does (rounded first so that e.g. 0.07 * 100 still lands on the edge of bin 7)
+        above = np.concatenate([np.cumsum(self.histograms[:, ::-1], axis=1)[:, ::-1],
+                                np.zeros((2, 1), dtype=np.int64)], axis=1)
+        edges = np.round(np.asarray(thresholds, dtype=np.float64) * self.bins, 6)
+        first_bin = np.clip(np.ceil(edges).astype(np.int64), 0, self.bins)
+        return above[1, first_bin], above[0, first_bin]
+
+    def _roc(self):
+        if self.bins is None:
+            labels, probabilities = self.labels, self.probabilities
+            order = np.argsort(-probabilities, kind='mergesort')
+            sorted_probabilities = probabilities[order]
+            sorted_labels = labels[order]
+            # Keep the last index of each run of equal scores
+            distinct = np.flatnonzero(np.diff(sorted_probabilities)) if len(order) else np.empty(0, int)
+            ends = np.r_[distinct, len(order) - 1] if len(order) else np.empty(0, int)
+            tp = np.cumsum(sorted_labels)[ends]
+            fp = (ends + 1) - tp
+            thresholds = sorted_probabilities[ends]
+        else:
+            cumulative = np.cumsum(self.histograms[:, ::-1], axis=1)
+            tp, fp = cumulative[1], cumulative[0]
+            thresholds = np.arange(self.bins, 0, -1) / self.bins - 1.0 / self.bins
+        positives, negatives = self.confusion[1].sum(), self.confusion[0].sum()
+        tpr = np.r_[0.0, tp / max(positives, 1)]
+        fpr = np.r_[0.0, fp / max(negatives, 1)]
+        return fpr, tpr, np.r_[np.inf, thresholds]
+
+    def result(self, sweep_thresholds=SWEEP_THRESHOLDS):
+        """Dict with loss, accuracy, confusion matrix, per-class report, ROC, AUC and sweep."""
+        positives, negatives = int(self.confusion[1].sum()), int(self.confusion[0].sum())
+        (tn, fp), (fn, tp) = self.confusion
+        report = {}
+        for label, name in enumerate(CLASS_NAMES):
+            hits = self.confusion[label, label]
+            predicted = self.confusion[:, label].sum()
+            actual = self.confusion[label].sum()
+            precision = hits / predicted if predicted else 0.0
+            recall = hits / actual if actual else 0.0
+            f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+            report[name] = {'precision': float(precision), 'recall': float(recall),
+                            'f1-score': float(f1), 'support': int(actual)}
+
+        result = {
+            'count': self.count,
+            'loss': self.loss_sum / max(self.count, 1) + self.regularization_loss,
+            'accuracy': float((tp + tn) / max(self.count, 1)),
+            'threshold': self.threshold,
+            'confusion_matrix': self.confusion.copy(),
+            'report': report,
+        }
+        if positives and negatives:
+            fpr, tpr, thresholds = self._roc()
+            result['roc'] = {'fpr': fpr, 'tpr': tpr, 'thresholds': thresholds}
+            result['auc'] = float(np.trapezoid(tpr, fpr) if hasattr(np, 'trapezoid') else np.trapz(tpr, fpr))
+            tp_sweep, fp_sweep = self._counts_at(sweep_thresholds)
+            sweep = _rates(tp_sweep, fp_sweep, positives, negatives)
+            sweep['thresholds'] = np.asarray(sweep_thresholds)
+            result['sweep'] = sweep
+            best = int(np.argmax(sweep['tpr'] - sweep['fpr'])) # Youden's J
+            result['best_threshold'] = float(sweep['thresholds'][best])
+        return result
+
+
+def format_classification_report(result, digits=2):
+    """Text report in the layout of sklearn's classification_report."""
+    width = max(len(name) for name in CLASS_NAMES + ('weighted avg',))
+    header = f"{'':>{width}} {'precision':>9} {'recall':>9} {'f1-score':>9} {'support':>9}"
+    lines = [header, '']
+    rows = result['report']
+    for name in CLASS_NAMES:
+        row = rows[name]
+        lines.append(f"{name:>{width}} {row['precision']:>9.{digits}f} {row['recall']:>9.{digits}f} "
+                     f"{row['f1-score']:>9.{digits}f} {row['support']:>9}")
+    total = sum(rows[name]['support'] for name in CLASS_NAMES)
+    lines.append('')
+    lines.append(f"{'accuracy':>{width}} {'':>9} {'':>9} {result['accuracy']:>9.{digits}f} {total:>9}")
+    for avg in ('macro avg', 'weighted avg'):
+        weights = np.array([rows[name]['support'] if avg == 'weighted avg' else 1 for name in CLASS_NAMES],
+                           dtype=np.float64)
+        weights /= max(weights.sum(), 1)
+        values = [sum(w * rows[name][key] for w, name in zip(weights, CLASS_NAMES))
+                  for key in ('precision', 'recall', 'f1-score')]
+        lines.append(f"{avg:>{width}} {values[0]:>9.{digits}f} {values[1]:>9.{digits}f} "
+                     f"{values[2]:>9.{digits}f} {total:>9}")
+    return '\n'.join(lines)
+
+
+def evaluate_model(model, dataset, threshold=THRESHOLD, bins=None):
+    """Run `model` once over a batched (images, labels) dataset and compute all metrics.
+
+    Returns (result, evaluator); with bins=None, evaluator.probabilities and
+    evaluator.labels hold the predictions in dataset order.
+    """
+    import tensorflow as tf
+
+    forward = tf.function(lambda x: model(x, training=False), reduce_retracing=True)
+    # model.evaluate reports the loss including the L2 penalties; add them once
+    regularization = float(sum(tf.reduce_sum(loss) for loss in model.losses)) if model.losses else 0.0
+    evaluator = Evaluator(threshold, bins, regularization)
+    for images, labels in dataset:
+        evaluator.update(labels.numpy(), forward(images).numpy())
+    return evaluator.result(), evaluator
+
+
+def print_evaluation(result):
+    print(f"\nTest Loss: {result['loss']:.4f}")
+    print(f"Test Accuracy: {result['accuracy']:.4f}")
+    if 'auc' in result:
+        print(f"Test AUC: {result['auc']:.4f} (best threshold by Youden's J: {result['best_threshold']:.2f})")
+    print("\nClassification Report:")
+    print(format_classification_report(result))
@@ -0,0 +1,201 @@
+"""Save and export the trained model for deployment.
+
+Writes the Keras model (.keras), a TensorFlow SavedModel and TFLite models
+with optional post-training quantization:
+
+- 'none':    float32 TFLite
+- 'dynamic': dynamic-range quantization (int8 weights, float activations)
+- 'int8':    full integer quantization, calibrated on a sample of the
+             validation images, with uint8 input and output
+
+compare_exports() reports model size, CPU latency and test accuracy/AUC of
+each export against the float32 Keras model.
+
+    python -m brain_tumor.export brain_tumor.keras "NN Dataset" --out-dir export
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+QUANTIZATIONS = ('none', 'dynamic', 'int8')
+CALIBRATION_SAMPLES = 200
+
+
+def save_model(model, export_dir, name='brain_tumor'):
+    """Write `name`.keras and a `name`_savedmodel directory; returns both paths."""
+    os.makedirs(export_dir, exist_ok=True)
+    keras_path = os.path.join(export_dir, f"{name}.keras")
+    saved_model_dir = os.path.join(export_dir, f"{name}_savedmodel")
+    model.save(keras_path)
+    model.export(saved_model_dir) # Inference-only SavedModel (serving_default signature)
+    return keras_path, saved_model_dir
+
+
+def _calibration_images(images, samples=CALIBRATION_SAMPLES, seed=0):
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(len(images), size=min(samples, len(images)), replace=False)
+    return np.sort(picked)
+
+
+def convert_to_tflite(model, quantization='none', calibration_images=None):
+    """Convert a Keras model to TFLite bytes.
+
+    `calibration_images` (uint8, N x H x W x 3, e.g. data[val_idx]) is
+    required for 'int8'; a random sample of CALIBRATION_SAMPLES is used.
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization {quantization!r}, expected one of {QUANTIZATIONS}")
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantization in ('dynamic', 'int8'):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'int8':
+        if calibration_images is None or len(calibration_images) == 0:
+            raise ValueError("int8 quantization needs calibration images (e.g. data[val_idx]).")
+        picked = _calibration_images(calibration_images)
+
+        def representative_dataset():
+            for i in picked:
+                # Calibrate on the same 0-1 float inputs the model was trained on
+                yield [calibration_images[i:i + 1].astype(np.float32) / 255.0]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+        converter.inference_output_type = tf.uint8
+    return converter.convert()
+
+
+class TFLiteModel:
+    """Batch predictor over a TFLite model taking uint8 images like the rest of the pipeline."""
+
+    def __init__(self, model_path_or_bytes, num_threads=None):
+        if isinstance(model_path_or_bytes, (bytes, bytearray)):
+            self.interpreter = tf.lite.Interpreter(model_content=bytes(model_path_or_bytes),
+                                                   num_threads=num_threads)
+        else:
+            self.interpreter = tf.lite.Interpreter(model_path=model_path_or_bytes,
+                                                   num_threads=num_threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = None
+
+    def _resize(self, batch_size):
+        if batch_size != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input['index'],
+                                                 [batch_size] + list(self.input['shape'][1:]))
+            self.interpreter.allocate_tensors()
+            self.batch_size = batch_size
+
+    def predict(self, images):
+        """uint8 images (N, H, W, 3) -> probabilities (N,)."""
+        self._resize(len(images))
+        if self.input['dtype'] == np.float32:
+            batch = images.astype(np.float32) / 255.0
+        else:
+            # Quantized input: map 0-1 floats through the input scale / zero point
+            scale, zero_point = self.input['quantization']
+            batch = np.round(images.astype(np.float32) / 255.0 / scale + zero_point)
+            limits = np.iinfo(self.input['dtype'])
+            batch = np.clip(batch, limits.min, limits.max).astype(self.input['dtype'])
+        self.interpreter.set_tensor(self.input['index'], batch)
+        self.interpreter.invoke()
+        output = self.interpreter.get_tensor(self.output['index']).reshape(-1)
+        if self.output['dtype'] != np.float32:
+            scale, zero_point = self.output['quantization']
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+def _measure(predict, images, labels, batch_size=64, latency_runs=50):
+    from sklearn.metrics import roc_auc_score
+
+    probabilities = np.concatenate([predict(images[i:i + batch_size])
+                                    for i in range(0, len(images), batch_size)])
+    single = images[:1]
+    predict(single) # Warm up
+    start = time.perf_counter()
+    for _ in range(latency_runs):
+        predict(single)
+    latency_ms = 1000.0 * (time.perf_counter() - start) / latency_runs
+    batch = images[:batch_size]
+    predict(batch)
+    start = time.perf_counter()
+    for _ in range(max(1, latency_runs // 10)):
+        predict(batch)
+    batch_ms = 1000.0 * (time.perf_counter() - start) / max(1, latency_runs // 10)
+    result = {'latency_ms_batch1': latency_ms,
+              f'latency_ms_batch{len(batch)}': batch_ms,
+              'accuracy': float(np.mean((probabilities > 0.5) == labels))}
+    if len(np.unique(labels)) == 2:
+        result['auc'] = float(roc_auc_score(labels, probabilities))
+    return result
+
+
+def compare_exports(model, keras_path, tflite_paths, test_images, test_labels):
+    """Size, CPU latency and accuracy/AUC of each TFLite export vs. the Keras model."""
+    predict_fn = tf.function(lambda x: model(tf.cast(x, tf.float32) / 255.0, training=False))
+    report = {'keras_float32': {'size_bytes': os.path.getsize(keras_path),
+                                **_measure(lambda x: predict_fn(x).numpy().reshape(-1),
+                                           test_images, test_labels)}}
+    for name, path in tflite_paths.items():
+        tflite_model = TFLiteModel(path)
+        report[f"tflite_{name}"] = {'size_bytes': os.path.getsize(path),
+                                    **_measure(tflite_model.predict, test_images, test_labels)}
+    for name, row in report.items():
+        print(f"{name:16s} {row['size_bytes'] / 1024**2:7.2f} MiB  "
+              f"{row['latency_ms_batch1']:7.2f} ms/image  acc {row['accuracy']:.4f}"
+              + (f"  AUC {row['auc']:.4f}" if 'auc' in row else ""))
+    return report
+
+
+def export_all(model, export_dir, calibration_images=None, quantizations=QUANTIZATIONS,
+               test_images=None, test_labels=None, name='brain_tumor'):
+    """Save Keras + SavedModel + one TFLite file per quantization, then compare them."""
+    keras_path, saved_model_dir = save_model(model, export_dir, name)
+    tflite_paths = {}
+    for quantization in quantizations:
+        if quantization == 'int8' and calibration_images is None:
+            print("Skipping int8 export: no calibration images given.")
+            continue
+        path = os.path.join(export_dir, f"{name}_{quantization}.tflite")
+        with open(path, 'wb') as f:
+            f.write(convert_to_tflite(model, quantization, calibration_images))
+        tflite_paths[quantization] = path
+    report = {'keras': keras_path, 'saved_model': saved_model_dir, 'tflite': tflite_paths}
+    if test_images is not None and len(test_images):
+        report['comparison'] = compare_exports(model, keras_path, tflite_paths, test_images, test_labels)
+        with open(os.path.join(export_dir, f"{name}_export_report.json"), 'w') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def main(argv=None):
+    from .data import load_image_folders
+    from .dedup import add_split_arguments, dataset_split
+
+    parser = argparse.ArgumentParser(description="Export a trained model to SavedModel and TFLite.")
+    parser.add_argument('model', help="trained Keras model (.keras)")
+    parser.add_argument('data_dir', help="dataset folder with no/ and yes/ (validation split calibrates "
+                                         "int8, test split is used for the comparison)")
+    parser.add_argument('--out-dir', default='export')
+    parser.add_argument('--quantize', nargs='+', choices=QUANTIZATIONS, default=list(QUANTIZATIONS))
+    parser.add_argument('--target-size', type=int, default=128)
+    add_split_arguments(parser)
+    args = parser.parse_args(argv)
+
+    model = tf.keras.models.load_model(args.model)
+    data, labels, _, _ = load_image_folders(
+        [os.path.join(args.data_dir, 'no'), os.path.join(args.data_dir, 'yes')],
+        (args.target_size, args.target_size))
+    # The training split (same dedup and seeds), so the test split is unseen
+    _, val_idx, test_idx = dataset_split(data, labels, dedup=args.dedup, max_distance=args.dedup_distance)
+    export_all(model, args.out_dir, data[val_idx], args.quantize, data[test_idx], labels[test_idx])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""Headless batch inference over a directory (or glob) of scans.
+
+    python -m brain_tumor.infer brain_tumor.keras "/data/scans" --out preds.csv
+    python -m brain_tumor.infer brain_tumor.keras "/data/**/*.jpg" --out preds.jsonl
+    python -m brain_tumor.infer brain_tumor.keras "/data/scans" --out preds.csv --gradcam overlays
+
+Files are listed lazily, decoded by the parallel loader while the previous
+batch is on the model, and every batch of rows is written (and flushed) as
+soon as it is predicted, so memory stays bounded for any number of images.
+
+With --gradcam DIR a Grad-CAM overlay (brain_tumor.explain) is written per
+image to DIR and its path added to the row; the batch's heatmaps come from
+the same forward pass that predicts it, plus one backward pass.
+
+For single images (notebook upload widget, scripts), load_model() and
+predict_image() need only this module: TensorFlow is imported when the
+model is loaded, nothing else heavy is.
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from .data import IMAGE_EXTENSIONS, TARGET_SIZE, LoadReport, iter_item_batches, load_image
+
+THRESHOLD = 0.5
+CLASS_NAMES = ('No Tumor', 'Yes Tumor')
+FIELDS = ('path', 'probability', 'label')
+
+
+def iter_input_paths(inputs):
+    """Yield image paths from directories (walked recursively) and glob patterns."""
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for root, dirs, files in os.walk(pattern):
+                dirs.sort()
+                for filename in sorted(files):
+                    if filename.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(root, filename)
+        else:
+            for path in sorted(glob.iglob(pattern, recursive=True)):
+                if path.lower().endswith(IMAGE_EXTENSIONS):
+                    yield path
+
+
+def load_model(model_path):
+    """Load a saved .keras model for inference (no optimizer state, no compile)."""
+    import tensorflow as tf
+
+    return tf.keras.models.load_model(model_path, compile=False)
+
+
+def prediction_result(probability, threshold=THRESHOLD):
+    """{probability, label, confidence} for one predicted tumor probability."""
+    predicted = int(probability > threshold)
+    confidence = probability if predicted else 1.0 - probability
+    return {'probability': float(probability), 'label': CLASS_NAMES[predicted], 'confidence': float(confidence)}
+
+
+_tta_predict_fns = {} # (id(model), views) -> compiled TTA function, traced once per model
+
+
+def tta_predict_fn(model, views):
+    """Cached brain_tumor.augment.make_tta_predict_fn for `model`."""
+    key = (id(model), views)
+    if key not in _tta_predict_fns:
+        from .augment import make_tta_predict_fn
+        _tta_predict_fns[key] = make_tta_predict_fn(model, views)
+    return _tta_predict_fns[key]
+
+
+_gradcam_fns = {} # id(model) -> compiled Grad-CAM function
+
+
+def gradcam_fn(model):
+    """Cached brain_tumor.explain.make_gradcam_fn for `model`."""
+    if id(model) not in _gradcam_fns:
+        from .explain import make_gradcam_fn
+        _gradcam_fns[id(model)] = make_gradcam_fn(model)
+    return _gradcam_fns[id(model)]
+
+
+def predict_image(model, image, target_size=TARGET_SIZE, threshold=THRESHOLD, tta=1):
+    """Predict one image given as a path, a file-like object or raw bytes.
+
+    Returns (result dict, resized uint8 image); raises ValueError if the
+    image cannot be decoded. Calls the model directly rather than
+    model.predict(), which sets up a whole dataset pipeline per call.
+    tta=K > 1 averages over K augmented views in one forward pass.
+    """
+    if isinstance(image, (bytes, bytearray)):
+        import io
+        image = io.BytesIO(image)
+    img_array, error, _ = load_image(image, target_size)
+    if img_array is None:
+        raise ValueError(error)
+    if tta > 1:
+        probability = float(tta_predict_fn(model, tta)(img_array[np.newaxis])[0])
+    else:
+        batch = img_array[np.newaxis].astype(np.float32) / 255.0 # Same 0-1 scaling as training
+        probability = float(np.asarray(model(batch, training=False)).reshape(-1)[0])
+    return prediction_result(probability, threshold), img_array
+
+
+def predict_paths(model, paths, target_size=TARGET_SIZE, batch_size=256, num_workers=None,
+                  threshold=THRESHOLD, report=None, tta=1, gradcam_dir=None):
+    """Yield one list of {path, probability, label} rows per predicted batch.
+
+    With tta=K > 1 each image is averaged over K augmented views; the forward
+    pass then runs on batch_size // K images (batch_size views) at a time.
+    With gradcam_dir, every row also gets the path of its Grad-CAM overlay
+    under 'gradcam' (the heatmap explains the plain, un-augmented prediction).
+    """
+    items = ((path, -1) for path in paths)
+    for images, _, batch_paths in iter_item_batches(items, target_size, batch_size, num_workers,
+                                                    report=report, print_errors=False):
+        overlays = None
+        if gradcam_dir:
+            from .explain import save_overlays
+            probabilities, heatmaps = gradcam_fn(model)(images)
+            overlays = save_overlays(images, heatmaps, batch_paths, gradcam_dir)
+            probabilities = np.asarray(probabilities)
+        if tta > 1:
+            step = max(1, batch_size // tta)
+            predict = tta_predict_fn(model, tta)
+            probabilities = np.concatenate([predict(images[i:i + step]) for i in range(0, len(images), step)])
+        elif overlays is None:
+            # Same 0-1 scaling as the training pipeline, done once per batch
+            batch = images.astype(np.float32) / 255.0
+            probabilities = np.asarray(model.predict_on_batch(batch)).reshape(-1)
+        rows = [{'path': path, 'probability': float(p), 'label': CLASS_NAMES[int(p > threshold)]}
+                for path, p in zip(batch_paths, probabilities)]
+        if overlays is not None:
+            for row, overlay_path in zip(rows, overlays):
+                row['gradcam'] = overlay_path
+        yield rows
+
+
+class RowWriter:
+    """Incremental CSV or JSONL writer (chosen from the file extension)."""
+
+    def __init__(self, path, fields=FIELDS):
+        self.file = sys.stdout if path == '-' else open(path, 'w', newline='')
+        self.jsonl = path.endswith(('.jsonl', '.json'))
+        self.fields = fields
+        if not self.jsonl:
+            self.csv = csv.DictWriter(self.file, fieldnames=fields, extrasaction='ignore')
+            self.csv.writeheader()
+
+    def write(self, rows):
+        for row in rows:
+            if self.jsonl:
+                self.file.write(json.dumps({k: row[k] for k in self.fields if k in row}) + '\n')
+            else:
+                self.csv.writerow(row)
+        self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+def run_inference(model_path, inputs, out_path, target_size=TARGET_SIZE, batch_size=256,
+                  num_workers=None, threshold=THRESHOLD, log_every=10000, tta=1, gradcam_dir=None):
+    """Predict every image matched by `inputs` and write rows to `out_path`."""
+    model = load_model(model_path)
+    report = LoadReport()
+    writer = RowWriter(out_path, FIELDS + ('gradcam',) if gradcam_dir else FIELDS)
+    start = time.perf_counter()
+    done = next_log = reported_skips = 0
+    try:
+        for rows in predict_paths(model, iter_input_paths(inputs), target_size, batch_size,
+                                  num_workers, threshold, report, tta, gradcam_dir):
+            writer.write(rows)
+            done += len(rows)
+            # Errors go to stderr so they never end up in rows written to stdout
+            for path, error in report.skipped[reported_skips:]:
+                print(f"Error: {error}", file=sys.stderr)
+            reported_skips = len(report.skipped)
+            if done >= next_log:
+                elapsed = time.perf_counter() - start
+                print(f"{done} images, {done / elapsed:.1f} images/sec", file=sys.stderr)
+                next_log += log_every
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Predicted {done} images in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.1f} images/sec), "
+          f"skipped {len(report.skipped)}.", file=sys.stderr)
+    return done, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch brain tumor prediction over a directory of scans.")
+    parser.add_argument('model', help="saved Keras model (.keras)")
+    parser.add_argument('inputs', nargs='+', help="directories and/or glob patterns")
+    parser.add_argument('--out', default='-', help="output .csv or .jsonl file (default: CSV to stdout)")
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--workers', type=int, default=None, help="decode workers (default: CPU count)")
+    parser.add_argument('--target-size', type=int, default=TARGET_SIZE[0])
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--tta', type=int, default=1, metavar='K',
+                        help="average over K test-time augmented views per image (1 = off, max 8)")
+    parser.add_argument('--gradcam', metavar='DIR',
+                        help="also write a Grad-CAM overlay JPEG per image to DIR (path added to each row)")
+    args = parser.parse_args(argv)
+
+    run_inference(args.model, args.inputs, args.out, (args.target_size, args.target_size),
+                  args.batch_size, args.workers, args.threshold, tta=args.tta, gradcam_dir=args.gradcam)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""The notebook's Sequential CNN, buildable outside the notebook.
+
+Three architectures share the conv/pool stages and the Dense(128) head:
+
+- 'flatten':   the original model. Flatten feeds ~14x14x128 = 25k features
+               into Dense(128), so that one layer holds ~3.2M parameters.
+- 'gap':       GlobalAveragePooling2D instead of Flatten (128 features).
+- 'separable': 'gap' with depthwise-separable convolutions in stages 2 and 3.
+
+`precision='mixed_bfloat16'` computes in bfloat16 (float32 weights); the
+output layer always stays float32 so the sigmoid and binary cross-entropy
+are numerically stable.
+"""
+
+from tensorflow.keras import regularizers
+from tensorflow.keras.layers import (Conv2D, Dense, Dropout, Flatten, GlobalAveragePooling2D,
+                                     Input, MaxPooling2D, SeparableConv2D)
+from tensorflow.keras.models import Sequential
+
+INPUT_SHAPE = (128, 128, 3)
+L2 = 0.01
+DROPOUT = 0.6
+ARCHITECTURES = ('flatten', 'gap', 'separable')
+PRECISIONS = ('float32', 'mixed_bfloat16')
+
+
+def build_model(input_shape=INPUT_SHAPE, l2=L2, dropout=DROPOUT, architecture='flatten',
+                precision='float32'):
+    """Three conv/pool stages, a pooling head, Dense(128) and a sigmoid output."""
+    if architecture not in ARCHITECTURES:
+        raise ValueError(f"Unknown architecture {architecture!r}, expected one of {ARCHITECTURES}")
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision {precision!r}, expected one of {PRECISIONS}")
+    # The first conv sees only 3 channels, so a separable version would save nothing
+    conv = SeparableConv2D if architecture == 'separable' else Conv2D
+    # Per-layer dtype policy instead of the global one, so building never changes other models
+    dtype = precision
+    head = Flatten(dtype=dtype) if architecture == 'flatten' else GlobalAveragePooling2D(dtype=dtype)
+    return Sequential([
+        Input(shape=input_shape),
+
+        # Convolutional Layer 1 with L2 regularization
+        Conv2D(32, (3, 3), activation='relu', kernel_regularizer=regularizers.l2(l2), dtype=dtype),
+        MaxPooling2D((2, 2), dtype=dtype),
+
+        # Convolutional Layer 2
+        conv(64, (3, 3), activation='relu', dtype=dtype),
+        MaxPooling2D((2, 2), dtype=dtype),
+
+        # Convolutional Layer 3
+        conv(128, (3, 3), activation='relu', dtype=dtype),
+        MaxPooling2D((2, 2), dtype=dtype),
+
+        head,
+
+        # Dense Layer with L2 regularization
+        Dense(128, activation='relu', kernel_regularizer=regularizers.l2(l2), dtype=dtype),
+        Dropout(dropout, dtype=dtype),
+
+        # Output Layer, always float32 for a stable sigmoid / binary_crossentropy
+        Dense(1, activation='sigmoid', dtype='float32'),
+    ], name=f"brain_tumor_{architecture}")
+
+
+def compile_model(model, optimizer='adam', jit_compile=None):
+    """Compile for binary classification, as in the notebook.
+
+    jit_compile=True compiles the train/predict steps with XLA; None keeps
+    the Keras default.
+    """
+    kwargs = {} if jit_compile is None else {'jit_compile': jit_compile}
+    model.compile(optimizer=optimizer,
+                  loss='binary_crossentropy',
+                  metrics=['accuracy'],
+                  **kwargs)
+    return model
+
+
+def count_flops(model):
+    """Multiply-add FLOPs (2 per MAC) of one forward pass on a single image.
+
+    Counts the conv and dense layers, which is where practically all the work
+    of these models is; pooling and activations are ignored.
+    """
+    flops = 0
+    for layer in model.layers:
+        if isinstance(layer, (Conv2D, SeparableConv2D, Dense)):
+            out_shape = layer.output.shape
+            in_channels = layer.input.shape[-1]
+        if isinstance(layer, SeparableConv2D):
+            kh, kw = layer.kernel_size
+            positions = out_shape[1] * out_shape[2]
+            flops += 2 * positions * kh * kw * in_channels # depthwise
+            flops += 2 * positions * in_channels * out_shape[-1] # pointwise
+        elif isinstance(layer, Conv2D):
+            kh, kw = layer.kernel_size
+            flops += 2 * out_shape[1] * out_shape[2] * kh * kw * in_channels * out_shape[-1]
+        elif isinstance(layer, Dense):
+            flops += 2 * in_channels * out_shape[-1]
+    return flops
@@ -0,0 +1,198 @@
+"""tf.data input pipelines over uint8 image arrays.
+
+Images stay uint8 in host memory (a plain array or a PreprocessedCache
+memmap); train/validation/test are index arrays into that one array, and each
+batch is gathered and normalized to float in the tf.data map stage.
+
+Class imbalance is handled without copying images either: make_dataset
+with balance=target_ratio draws the training indices from one stream per
+class in that ratio, and class_weights() gives the equivalent loss weights
+for model.fit(class_weight=...). balance_report() shows what either does to
+each class.
+
+TensorFlow and scikit-learn are imported on first use, so split_indices and
+the constants are cheap to import (e.g. for inference-only processes).
+"""
+
+import numpy as np
+
+BATCH_SIZE = 128
+
+
+def _check_stratifiable(labels, name):
+    classes, counts = np.unique(labels, return_counts=True)
+    if not len(counts) or counts.min() < 2:
+        found = ", ".join(f"class {c}: {n}" for c, n in zip(classes, counts)) or "no samples"
+        raise ValueError(f"Not enough data in {name} for a stratified split: every class needs at "
+                         f"least 2 samples ({found}).")
+
+
+def split_indices(labels, test_size=0.2, val_size=0.25, test_seed=42, val_seed=49, groups=None):
+    """Stratified train/validation/test split returned as index arrays.
+
+    Same proportions and seeds as the notebook's two train_test_split calls
+    (20% test, then 25% of the rest for validation), but only indices are
+    shuffled around, never the image data.
+
+    groups (e.g. brain_tumor.dedup.duplicate_groups) keeps every group in a
+    single split: the groups are split, stratified by the label of their
+    first member, and then expanded back to their images.
+
+    Raises ValueError, before splitting, when a class has fewer than 2
+    samples (images, or groups with `groups`) overall or in the
+    train+validation part, which stratification cannot split.
+    """
+    from sklearn.model_selection import train_test_split
+
+    labels = np.asarray(labels)
+    if groups is not None:
+        groups = np.asarray(groups)
+        _, first = np.unique(groups, return_index=True)
+        group_train, group_val, group_test = split_indices(labels[first], test_size, val_size,
+                                                           test_seed, val_seed)
+        # Expand group splits back to image indices, in image order
+        return tuple(np.flatnonzero(np.isin(groups, groups[first[split]]))
+                     for split in (group_train, group_val, group_test))
+    indices = np.arange(len(labels))
+    _check_stratifiable(labels, "the dataset")
+    train_val_idx, test_idx = train_test_split(
+        indices, test_size=test_size, random_state=test_seed, stratify=labels
+    )
+    _check_stratifiable(labels[train_val_idx], "the train+validation set")
+    train_idx, val_idx = train_test_split(
+        train_val_idx, test_size=val_size, random_state=val_seed, stratify=labels[train_val_idx]
+    )
+    return train_idx, val_idx, test_idx
+
+
+def _target_fractions(target_ratio, num_classes):
+    ratio = np.ones(num_classes) if target_ratio is None else np.asarray(target_ratio, dtype=np.float64)
+    if ratio.shape != (num_classes,) or (ratio < 0).any() or ratio.sum() <= 0:
+        raise ValueError(f"target_ratio needs one non-negative weight per class ({num_classes}), "
+                         f"got {target_ratio!r}")
+    return ratio / ratio.sum()
+
+
+def class_weights(labels, target_ratio=None):
+    """{class: weight} for model.fit(class_weight=...), reweighting `labels` to `target_ratio`.
+
+    target_ratio is one relative weight per class, e.g. (1, 1) (the default)
+    for equal classes or (1, 2) for twice as many positives. The weights
+    average 1 over the samples, so the loss scale and learning rate stay as
+    they are.
+    """
+    counts = np.bincount(np.asarray(labels, dtype=np.int64))
+    fractions = _target_fractions(target_ratio, len(counts))
+    weights = np.divide(fractions * counts.sum(), counts, out=np.zeros(len(counts)), where=counts > 0)
+    return {c: float(w) for c, w in enumerate(weights)}
+
+
+def balance_report(labels, target_ratio=None):
+    """Per-class counts, natural vs target share, and how often each image is used per epoch.
+
+    draws_per_image is the expected number of times one image of the class
+    is sampled per epoch with make_dataset(balance=target_ratio) (above 1:
+    oversampled, below 1: undersampled); it equals the class weight the same
+    ratio gives through class_weights().
+    """
+    counts = np.bincount(np.asarray(labels, dtype=np.int64))
+    fractions = _target_fractions(target_ratio, len(counts))
+    weights = class_weights(labels, target_ratio)
+    return {str(c): {'count': int(count), 'natural_fraction': float(count / counts.sum()),
+                     'target_fraction': float(fractions[c]), 'draws_per_image': weights[c],
+                     'class_weight': weights[c]}
+            for c, count in enumerate(counts)}
+
+
+def balanced_indices(indices, classes, fractions, rng):
+    """One epoch (len(indices) draws) of `indices` resampled to class shares `fractions`.
+
+    Each position picks class c with probability fractions[c]; within a
+    class the images are taken from back-to-back random permutations, so
+    every image is used once before any is repeated.
+    """
+    present = np.array([f > 0 and np.any(classes == c) for c, f in enumerate(fractions)])
+    if not present.any():
+        raise ValueError("balance leaves no class with both samples and a non-zero weight")
+    probabilities = np.where(present, fractions, 0.0)
+    choices = rng.choice(len(fractions), size=len(indices), p=probabilities / probabilities.sum())
+    epoch = np.empty(len(indices), dtype=np.int64)
+    for c in np.flatnonzero(present):
+        members = indices[classes == c]
+        slots = np.flatnonzero(choices == c)
+        repeats = -(-len(slots) // len(members))
+        epoch[slots] = np.concatenate([rng.permutation(members) for _ in range(repeats)])[:len(slots)]
+    return epoch
+
+
+def normalize_images(images, dtype='float32'):
+    """uint8 pixels -> `dtype` in 0-1 (float32, or float16 to halve bandwidth)."""
+    import tensorflow as tf
+
+    return tf.cast(images, dtype) / tf.constant(255.0, dtype)
+
+
+def make_dataset(data, labels, indices, batch_size=BATCH_SIZE, shuffle=False,
+                 dtype='float32', seed=None, augment=False, shard=None, drop_remainder=False,
+                 balance=None):
+    """Batched (images, labels) dataset reading rows `indices` of `data`.
+
+    Each batch of indices is gathered from the uint8 array with NumPy, so the
+    dataset never embeds a copy of the images in the graph; a memmap works as
+    well as an in-memory array. Shuffling happens on the indices and is
+    redone every epoch. With augment=True the batched augmentation stage from
+    brain_tumor.augment runs after the gather, in parallel with AUTOTUNE.
+
+    shard=(index, count) is for data-parallel training: every worker builds
+    the same (seeded) sequence of global batches of `batch_size` indices and
+    keeps every count-th one starting at `index`, so together the workers see
+    exactly the batches a single process would, and each only reads its rows.
+
+    balance=target_ratio (one weight per class, e.g. (1, 1)) replaces the
+    epoch's shuffle with weighted resampling (balanced_indices, redrawn every
+    epoch): each position of the epoch comes from class c with probability
+    target_ratio[c] / sum(target_ratio). The epoch keeps len(indices)
+    samples, so minority images are repeated and majority images skipped;
+    only indices are resampled, the images are never copied. With shard,
+    pass a seed so all workers draw the same sequence.
+    """
+    import tensorflow as tf
+
+    indices = np.asarray(indices, dtype=np.int64)
+    labels = np.asarray(labels)
+    image_shape = data.shape[1:]
+
+    def gather(batch_indices):
+        return data[batch_indices], labels[batch_indices].astype(np.float32)
+
+    def load_batch(batch_indices):
+        images, batch_labels = tf.numpy_function(gather, [batch_indices], (tf.uint8, tf.float32))
+        images.set_shape((None,) + image_shape)
+        batch_labels.set_shape((None,))
+        return normalize_images(images, dtype), batch_labels
+
+    if balance is not None:
+        classes = labels[indices].astype(np.int64)
+        fractions = _target_fractions(balance, int(classes.max()) + 1)
+
+        def balanced_epoch(epoch_seed):
+            return balanced_indices(indices, classes, fractions, np.random.default_rng(epoch_seed))
+
+        # One fresh seed per epoch (the same sequence on every worker for a given seed)
+        dataset = tf.data.Dataset.random(seed=seed, rerandomize_each_iteration=True).take(1)
+        dataset = dataset.map(lambda epoch_seed: tf.numpy_function(balanced_epoch, [epoch_seed], tf.int64))
+        dataset = dataset.unbatch()
+    else:
+        dataset = tf.data.Dataset.from_tensor_slices(indices)
+    if shuffle and balance is None:
+        dataset = dataset.shuffle(buffer_size=len(indices), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size, drop_remainder=drop_remainder)
+    if shard is not None:
+        index, count = shard
+        dataset = dataset.map(lambda batch_indices: batch_indices[index::count])
+    dataset = dataset.map(load_batch, num_parallel_calls=tf.data.AUTOTUNE)
+    if augment:
+        # The uint8 array already plays the role of .cache(); only augmentation is redone per epoch
+        from .augment import augment_batch
+        dataset = dataset.map(augment_batch, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,200 @@
+"""Per-step training instrumentation.
+
+StepProfiler is a Keras callback that records, for every training step,
+the step time, images, resident memory and the learning rate, and
+summarizes each epoch with its input wait vs. compute time, images/sec and
+a verdict on whether the input or the model is the bottleneck.
+
+    profiler = StepProfiler('logs/profile')
+    model.fit(profiler.instrument(train_dataset), callbacks=[profiler], ...)
+
+Keras pulls batches inside the compiled train step, where a callback
+cannot see them, so instrument() adds a map stage that stamps the time
+each batch becomes available (after the dataset's own prefetch) and its
+size; the batches themselves stay in tf.data. A step waited for input for
+as long as its batch became available after the step started. The wait is
+reported per epoch only: within an epoch it is exact in total, while a
+single step's share depends on where Keras' own bookkeeping falls. Without
+instrument() only step times are recorded. Outputs, in `log_dir`:
+
+- steps.jsonl / epochs.jsonl: structured per-step and per-epoch records
+- metrics.prom: Prometheus text exposition of the latest epoch, rewritten
+  every epoch (point a node_exporter textfile collector at it)
+- with trace_steps=(start, stop): a TensorFlow profiler trace of those
+  global steps, viewable in TensorBoard's Profile tab
+"""
+
+import json
+import os
+import time
+from collections import deque
+
+import numpy as np
+import tensorflow as tf
+
+from .resources import current_rss_mb, peak_rss_mb
+
+METRIC_PREFIX = 'brain_tumor_train'
+INPUT_BOUND_FRACTION = 0.3 # Epochs waiting on input for more than this share of step time are input-bound
+
+
+def prometheus_text(metrics, prefix=METRIC_PREFIX):
+    """Prometheus text format for {name: (type, help, value)}; value may be {labels: value}."""
+    lines = []
+    for name, (metric_type, help_text, value) in metrics.items():
+        full_name = f"{prefix}_{name}"
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} {metric_type}")
+        if isinstance(value, dict):
+            for labels, sample in value.items():
+                lines.append(f"{full_name}{{{labels}}} {float(sample):.6g}")
+        else:
+            lines.append(f"{full_name} {float(value):.6g}")
+    return '\n'.join(lines) + '\n'
+
+
+class StepProfiler(tf.keras.callbacks.Callback):
+    """Records input wait, compute time, throughput, memory and LR per step and per epoch."""
+
+    def __init__(self, log_dir, log_steps=True, trace_steps=None, verbose=True):
+        super().__init__()
+        self.log_dir = log_dir
+        self.log_steps = log_steps
+        self.trace_steps = trace_steps
+        self.verbose = verbose
+        self.epochs = [] # One summary dict per epoch
+        self.global_step = 0
+        self._instrumented = False
+        self._ready = deque() # (perf_counter time, batch size) of batches available to the train step
+        self._tracing = False
+        os.makedirs(log_dir, exist_ok=True)
+
+    def instrument(self, dataset):
+        """Same batches as `dataset`, with the time each one becomes available recorded.
+
+        Only a timestamp and the batch size cross into Python; the batches
+        are produced and prefetched by tf.data as before.
+        """
+        self._instrumented = True
+        ready = self._ready
+
+        def mark(batch_size):
+            ready.append((time.perf_counter(), int(batch_size)))
+            return batch_size
+
+        def stamp(*batch):
+            batch = batch if len(batch) > 1 else batch[0]
+            size = tf.shape(tf.nest.flatten(batch)[0], out_type=tf.int64)[0]
+            with tf.control_dependencies([tf.numpy_function(mark, [size], tf.int64)]):
+                return tf.nest.map_structure(tf.identity, batch)
+
+        return dataset.map(stamp).prefetch(tf.data.AUTOTUNE)
+
+    def _write_lines(self, name, rows):
+        with open(os.path.join(self.log_dir, name), 'a') as f:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+
+    def _learning_rate(self):
+        try:
+            return float(self.model.optimizer.learning_rate)
+        except (AttributeError, TypeError):
+            return float('nan')
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch = epoch
+        self._steps = []
+        self._epoch_wait = 0.0
+        self._epoch_start = time.perf_counter()
+
+    def on_train_batch_begin(self, batch, logs=None):
+        if self.trace_steps and self.global_step == self.trace_steps[0] and not self._tracing:
+            tf.profiler.experimental.start(os.path.join(self.log_dir, 'trace'))
+            self._tracing = True
+        self._step_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        step_seconds = time.perf_counter() - self._step_start
+        self.global_step += 1
+        if self._tracing and self.global_step >= self.trace_steps[1]:
+            tf.profiler.experimental.stop()
+            self._tracing = False
+        row = {'epoch': self._epoch, 'step': batch, 'global_step': self.global_step,
+               'step_seconds': step_seconds, 'images': None, 'images_per_sec': None,
+               'rss_mb': current_rss_mb(), 'learning_rate': self._learning_rate()}
+        if self._instrumented and self._ready:
+            # Batches are consumed in the order they became available, one per step
+            ready_time, images = self._ready.popleft()
+            self._epoch_wait += min(step_seconds, max(0.0, ready_time - self._step_start))
+            row.update(images=images, images_per_sec=images / step_seconds)
+        if logs and 'loss' in logs:
+            row['loss'] = float(logs['loss'])
+        self._steps.append(row)
+
+    def on_epoch_end(self, epoch, logs=None):
+        steps = self._steps
+        if not steps:
+            return
+        if self._tracing: # Window ran past the end of training: close it here
+            tf.profiler.experimental.stop()
+            self._tracing = False
+        step_seconds = np.array([row['step_seconds'] for row in steps])
+        total = float(step_seconds.sum())
+        summary = {'epoch': epoch, 'steps': len(steps), 'wall_seconds': time.perf_counter() - self._epoch_start,
+                   'step_seconds_p50': float(np.percentile(step_seconds, 50)),
+                   'step_seconds_p95': float(np.percentile(step_seconds, 95)),
+                   'step_seconds_total': total,
+                   'rss_mb': current_rss_mb(), 'peak_rss_mb': peak_rss_mb(),
+                   'learning_rate': self._learning_rate()}
+        if self._instrumented:
+            wait = self._epoch_wait
+            images = sum(row['images'] or 0 for row in steps)
+            summary.update(input_wait_seconds=wait, compute_seconds=total - wait,
+                           input_wait_fraction=wait / total if total else 0.0,
+                           images=images, images_per_sec=images / total if total else 0.0)
+            summary['bottleneck'] = 'input' if summary['input_wait_fraction'] > INPUT_BOUND_FRACTION else 'model'
+        summary.update({key: float(value) for key, value in (logs or {}).items()})
+        self.epochs.append(summary)
+
+        if self.log_steps:
+            self._write_lines('steps.jsonl', steps)
+        self._write_lines('epochs.jsonl', [summary])
+        self._write_prometheus(summary)
+        if self.verbose:
+            detail = (f", input wait {100 * summary['input_wait_fraction']:.0f}% of step time, "
+                      f"{summary['images_per_sec']:.1f} images/sec -> {summary['bottleneck']}-bound"
+                      if self._instrumented else "")
+            print(f"[profile] Epoch {epoch + 1}: step p50 {1000 * summary['step_seconds_p50']:.0f} ms, "
+                  f"p95 {1000 * summary['step_seconds_p95']:.0f} ms{detail}, RSS {summary['rss_mb']:.0f} MiB")
+
+    def _write_prometheus(self, summary):
+        metrics = {
+            'epoch': ('gauge', "Last completed epoch (1-based).", summary['epoch'] + 1),
+            'steps_total': ('counter', "Training steps run.", self.global_step),
+            'step_seconds': ('gauge', "Step time in the last epoch.",
+                             {'quantile="0.5"': summary['step_seconds_p50'],
+                              'quantile="0.95"': summary['step_seconds_p95']}),
+            'rss_bytes': ('gauge', "Resident memory.", summary['rss_mb'] * 1024 ** 2),
+            'peak_rss_bytes': ('gauge', "Peak resident memory.", summary['peak_rss_mb'] * 1024 ** 2),
+            'learning_rate': ('gauge', "Optimizer learning rate.", summary['learning_rate']),
+        }
+        if self._instrumented:
+            metrics.update({
+                'input_wait_ratio': ('gauge', "Share of step time spent waiting for input in the last epoch.",
+                                     summary['input_wait_fraction']),
+                'images_per_second': ('gauge', "Training throughput in the last epoch.",
+                                      summary['images_per_sec']),
+            })
+        for key in ('loss', 'val_loss', 'accuracy', 'val_accuracy'):
+            if key in summary:
+                metrics[key] = ('gauge', f"Keras {key} of the last epoch.", summary[key])
+        path = os.path.join(self.log_dir, 'metrics.prom')
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(prometheus_text(metrics))
+        os.replace(tmp_path, path) # Scrapers never read a half-written file
+
+    def on_train_end(self, logs=None):
+        if self._tracing:
+            tf.profiler.experimental.stop()
+            self._tracing = False
@@ -0,0 +1,202 @@
+"""Sharded TFRecord export and streaming input pipelines.
+
+For datasets larger than RAM: convert the no/ and yes/ folders once into
+TFRecord shards holding the resized uint8 pixels, the label and the split,
+then train/validate/test by streaming the shards with parallel interleaved
+reads. Memory stays at a few shuffle/prefetch buffers whatever the dataset
+size, instead of one array with every image.
+
+    python -m brain_tumor.records "NN Dataset" --out-dir records --shards 8
+
+writes records/{train,val,test}-XXXXX-of-NNNNN.tfrecord and metadata.json.
+The split is the canonical one of the in-memory pipeline
+(dedup.grouped_split: same proportions, seeds, stratification and
+near-duplicate handling) over the files that decode; the others are
+reported and left out (with --dedup none the files are not decoded before
+splitting, so the split is over the listed files). metadata.json lists the
+files of every split and the near-duplicate groups, so the split can be
+checked or reproduced.
+
+Without --cache-dir the images are decoded twice, once to hash them for the
+split and once to write them; with a PreprocessedCache they are decoded at
+most once and the records are written from its rows.
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from .data import RESAMPLE, TARGET_SIZE, LoadReport, iter_item_batches, list_image_files
+from .dedup import (DEDUP, MAX_DISTANCE, add_split_arguments, dhash, duplicate_groups, duplicate_report,
+                    grouped_split)
+from .pipeline import BATCH_SIZE, normalize_images
+
+SPLITS = ('train', 'val', 'test')
+METADATA_FILE = 'metadata.json'
+SHUFFLE_BUFFER = 2048 # images; ~100 MiB of 128x128 uint8
+FEATURES = {
+    'image': tf.io.FixedLenFeature([], tf.string),
+    'label': tf.io.FixedLenFeature([], tf.int64),
+}
+
+
+def _example(image, label):
+    return tf.train.Example(features=tf.train.Features(feature={
+        'image': tf.train.Feature(bytes_list=tf.train.BytesList(value=[image.tobytes()])),
+        'label': tf.train.Feature(int64_list=tf.train.Int64List(value=[int(label)])),
+    })).SerializeToString()
+
+
+def _shard_name(split, shard, num_shards):
+    return f"{split}-{shard:05d}-of-{num_shards:05d}.tfrecord"
+
+
+def _hash_items(items, target_size, batch_size, num_workers, use_processes, report, resample):
+    """Decode every item once in batches; returns (decoded items, their dHashes)."""
+    labels = dict(items)
+    decoded, hashes = [], []
+    for images, _, paths in iter_item_batches(items, target_size, batch_size, num_workers, use_processes,
+                                              report, resample, normalize=False):
+        decoded += [(path, labels[path]) for path in paths]
+        hashes.append(dhash(images))
+    return decoded, np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64)
+
+
+def write_records(class_dirs, out_dir, target_size=TARGET_SIZE, num_shards=8, batch_size=256,
+                  num_workers=None, use_processes=False, resample=RESAMPLE, dedup=DEDUP,
+                  max_distance=MAX_DISTANCE, cache_dir=None):
+    """Decode the class folders into per-split TFRecord shards.
+
+    Images are decoded in batches by the parallel loader (or read from the
+    PreprocessedCache in `cache_dir`) and written round-robin over
+    `num_shards` files per split (fewer for small splits), so no more than
+    one batch is ever held in memory. Returns the metadata dict that is also
+    written to out_dir/metadata.json.
+    """
+    from .cache import PreprocessedCache
+
+    start = time.perf_counter()
+    os.makedirs(out_dir, exist_ok=True)
+    report = LoadReport()
+    hashes = data = None
+    write_report = report
+    if cache_dir:
+        cache = PreprocessedCache(cache_dir, target_size, resample)
+        data, labels, paths, report = cache.load(class_dirs, num_workers=num_workers)
+        items = list(zip(paths, labels))
+        if dedup not in (None, 'none'):
+            hashes = cache.hashes(paths)
+    elif dedup not in (None, 'none'):
+        items, hashes = _hash_items(list_image_files(class_dirs), target_size, batch_size, num_workers,
+                                    use_processes, report, resample)
+        write_report = LoadReport() # Second decode of the same files; the first one is reported
+    else:
+        items = list_image_files(class_dirs)
+    labels = np.array([label for _, label in items], dtype=int)
+    groups = duplicate_groups(hashes, max_distance) if hashes is not None else None
+    metadata = {'target_size': list(target_size), 'resample': int(resample),
+                'dedup': dedup if dedup != 'none' else None, 'dedup_distance': max_distance, 'splits': {}}
+    if groups is not None:
+        duplicates = duplicate_report(groups, labels, [path for path, _ in items])
+        ids, sizes = np.unique(groups, return_counts=True)
+        duplicates['members'] = [[items[i][0] for i in np.flatnonzero(groups == group)]
+                                 for group in ids[sizes > 1]]
+        metadata['duplicates'] = duplicates
+        print(f"Duplicates: {duplicates['redundant_images']} near-duplicate images in "
+              f"{duplicates['duplicate_groups']} groups (distance <= {max_distance}), dedup={dedup}")
+
+    for split, indices in zip(SPLITS, grouped_split(labels, groups, dedup)):
+        split_items = [items[i] for i in indices] # split_indices order is already shuffled
+        shards = max(1, min(num_shards, len(split_items)))
+        names = [_shard_name(split, shard, shards) for shard in range(shards)]
+        writers = [tf.io.TFRecordWriter(os.path.join(out_dir, name)) for name in names]
+        written = 0
+        per_class = np.zeros(len(class_dirs), dtype=np.int64)
+        if data is not None:
+            batches = ((np.asarray(data[indices[i:i + batch_size]]), labels[indices[i:i + batch_size]], None)
+                       for i in range(0, len(indices), batch_size))
+        else:
+            batches = iter_item_batches(split_items, target_size, batch_size, num_workers, use_processes,
+                                        write_report, resample, normalize=False)
+        try:
+            for images, batch_labels, _ in batches:
+                for image, label in zip(images, batch_labels):
+                    writers[written % shards].write(_example(image, label))
+                    written += 1
+                per_class += np.bincount(batch_labels, minlength=len(class_dirs))
+        finally:
+            for writer in writers:
+                writer.close()
+        metadata['splits'][split] = {'files': names, 'count': written,
+                                     'per_class': {str(k): int(v) for k, v in enumerate(per_class)},
+                                     'paths': [path for path, _ in split_items]}
+        print(f"{split}: {written} images in {shards} shard(s)")
+
+    metadata['skipped'] = [{'path': path, 'error': error} for path, error in report.skipped]
+    metadata['seconds'] = time.perf_counter() - start
+    with open(os.path.join(out_dir, METADATA_FILE), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    print(report.summary())
+    return metadata
+
+
+def read_metadata(record_dir):
+    with open(os.path.join(record_dir, METADATA_FILE)) as f:
+        return json.load(f)
+
+
+def make_record_dataset(record_dir, split, batch_size=BATCH_SIZE, shuffle=False, dtype=tf.float32,
+                        seed=None, augment=False, shuffle_buffer=SHUFFLE_BUFFER, cycle_length=None):
+    """Batched (images, labels) dataset streaming one split's TFRecord shards.
+
+    Shards are read in parallel with interleave (shard order and records are
+    reshuffled every epoch when shuffle=True, through a bounded buffer);
+    parsing, decoding and normalization run once per batch. Without shuffle
+    the order is deterministic, so evaluation labels line up across runs.
+    """
+    metadata = read_metadata(record_dir)
+    width, height = metadata['target_size']
+    files = [os.path.join(record_dir, name) for name in metadata['splits'][split]['files']]
+
+    def parse_batch(serialized):
+        parsed = tf.io.parse_example(serialized, FEATURES)
+        images = tf.reshape(tf.io.decode_raw(parsed['image'], tf.uint8), (-1, height, width, 3))
+        return normalize_images(images, dtype), tf.cast(parsed['label'], tf.float32)
+
+    dataset = tf.data.Dataset.from_tensor_slices(files)
+    if shuffle:
+        dataset = dataset.shuffle(len(files), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.interleave(tf.data.TFRecordDataset,
+                                 cycle_length=cycle_length or min(len(files), os.cpu_count() or 1),
+                                 num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle)
+    if shuffle:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size).map(parse_batch, num_parallel_calls=tf.data.AUTOTUNE)
+    if augment:
+        from .augment import augment_batch
+        dataset = dataset.map(augment_batch, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the dataset folders to sharded TFRecords.")
+    parser.add_argument('data_dir', help="dataset folder with no/ and yes/")
+    parser.add_argument('--out-dir', default='records')
+    parser.add_argument('--shards', type=int, default=8, help="shards per split")
+    parser.add_argument('--target-size', type=int, default=TARGET_SIZE[0])
+    parser.add_argument('--workers', type=int, default=None, help="decode workers")
+    parser.add_argument('--cache-dir', help="PreprocessedCache folder to read the images from")
+    add_split_arguments(parser)
+    args = parser.parse_args(argv)
+    write_records([os.path.join(args.data_dir, 'no'), os.path.join(args.data_dir, 'yes')],
+                  args.out_dir, (args.target_size, args.target_size), args.shards,
+                  num_workers=args.workers, dedup=args.dedup, max_distance=args.dedup_distance,
+                  cache_dir=args.cache_dir)
+
+
+if __name__ == '__main__':
+    main()
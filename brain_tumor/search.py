@@ -0,0 +1,232 @@
+"""Parallel hyperparameter search with asynchronous successive halving (ASHA).
+
+Searches the knobs the notebook hardcodes: L2 strength, dropout, batch size
+and the ReduceLROnPlateau factor/patience, with the number of epochs as the
+budget. Trials run concurrently in a process pool; every worker process
+memory-maps the same PreprocessedCache once and reuses it for all of its
+trials. ASHA promotes the top 1/eta of the trials at each rung (min_epochs,
+min_epochs * eta, ...) to the next one as soon as enough results are in, so
+hopeless configurations stop after min_epochs while no worker sits idle
+waiting for a rung to fill. A promoted trial resumes from its checkpoint
+instead of starting over.
+
+    python -m brain_tumor.search "NN Dataset" --cache-dir /tmp/cache --trials 27 --workers 3
+
+Every finished rung is appended to out_dir/trials.jsonl (config, val_loss,
+val_accuracy, epochs, wall time); the best configuration goes to
+out_dir/best.json. Use a fresh out_dir per search: trial checkpoints in it
+are resumed.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from .dedup import DEDUP, MAX_DISTANCE, add_split_arguments, dataset_split
+
+SEARCH_SPACE = {
+    'l2': [0.001, 0.003, 0.01, 0.03],
+    'dropout': [0.3, 0.45, 0.6],
+    'batch_size': [32, 64, 128],
+    'lr_factor': [0.2, 0.5],
+    'lr_patience': [2, 3, 5],
+}
+
+_worker = {} # Per-process state set by _init_worker: data, labels, split indices
+
+
+def sample_configs(count, space=SEARCH_SPACE, seed=0):
+    """`count` random configurations from `space` (distinct while the space allows)."""
+    rng = np.random.default_rng(seed)
+    total = int(np.prod([len(values) for values in space.values()]))
+    configs, seen = [], set()
+    while len(configs) < count:
+        config = {name: values[rng.integers(len(values))] for name, values in space.items()}
+        key = tuple(config.values())
+        if key in seen and len(seen) < total:
+            continue
+        seen.add(key)
+        configs.append({name: value.item() if hasattr(value, 'item') else value
+                        for name, value in config.items()})
+    return configs
+
+
+def rung_budgets(min_epochs, max_epochs, eta):
+    """Epoch budget of each rung: min_epochs * eta**k, capped at max_epochs."""
+    budgets = [min_epochs]
+    while budgets[-1] < max_epochs:
+        budgets.append(min(budgets[-1] * eta, max_epochs))
+    return budgets
+
+
+def _init_worker(cache_dir, class_dirs, target_size, threads, train_idx, val_idx):
+    import tensorflow as tf
+
+    from .cache import PreprocessedCache
+
+    if threads:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(max(1, threads // 2))
+    data, labels, _, _ = PreprocessedCache(cache_dir, target_size).load(class_dirs)
+    _worker.update(data=data, labels=labels, train_idx=train_idx, val_idx=val_idx)
+
+
+def _run_trial(trial_id, config, epochs, trial_dir, seed):
+    """Train trial `trial_id` up to `epochs` total epochs, resuming from its checkpoint."""
+    import tensorflow as tf
+
+    from .checkpoint import TrainingCheckpoint
+    from .model import build_model, compile_model
+    from .pipeline import make_dataset
+
+    start = time.perf_counter()
+    data, labels = _worker['data'], _worker['labels']
+    tf.keras.utils.set_random_seed(seed + trial_id)
+    model = compile_model(build_model(data.shape[1:], l2=config['l2'], dropout=config['dropout']))
+    reduce_lr = tf.keras.callbacks.ReduceLROnPlateau(monitor='val_loss', factor=config['lr_factor'],
+                                                     patience=config['lr_patience'], min_lr=1e-6)
+    checkpoint = TrainingCheckpoint(trial_dir, [reduce_lr], max_to_keep=1)
+    initial_epoch = checkpoint.restore(model)
+    model.fit(make_dataset(data, labels, _worker['train_idx'], config['batch_size'], shuffle=True,
+                           augment=True),
+              validation_data=make_dataset(data, labels, _worker['val_idx'], config['batch_size']),
+              epochs=epochs, initial_epoch=initial_epoch, callbacks=[reduce_lr, checkpoint], verbose=0)
+    history = checkpoint.history
+    best = int(np.argmin(history['val_loss']))
+    return {'trial': trial_id, 'epochs': epochs, 'config': config,
+            'val_loss': history['val_loss'][best], 'val_accuracy': history['val_accuracy'][best],
+            'best_epoch': best + 1, 'seconds': time.perf_counter() - start, 'pid': os.getpid()}
+
+
+class ASHA:
+    """Asynchronous successive halving bookkeeping (lower score is better)."""
+
+    def __init__(self, configs, budgets, eta):
+        self.configs = configs
+        self.budgets = budgets
+        self.eta = eta
+        self.scores = [{} for _ in budgets] # rung -> {trial: score}
+        self.promoted = [set() for _ in budgets]
+        self.started = 0
+
+    def next_job(self):
+        """(trial, rung) to run next, or None if nothing can start right now."""
+        for rung in reversed(range(len(self.budgets) - 1)):
+            scores = self.scores[rung]
+            top = sorted(scores, key=scores.get)[:len(scores) // self.eta]
+            for trial in top:
+                if trial not in self.promoted[rung]:
+                    self.promoted[rung].add(trial)
+                    return trial, rung + 1
+        if self.started < len(self.configs):
+            self.started += 1
+            return self.started - 1, 0
+        return None
+
+    def report(self, trial, rung, score):
+        self.scores[rung][trial] = score
+
+
+def run_search(cache_dir, class_dirs, out_dir, num_trials=27, num_workers=None, min_epochs=2,
+               max_epochs=30, eta=3, target_size=(128, 128), space=SEARCH_SPACE, seed=0,
+               dedup=DEDUP, max_distance=MAX_DISTANCE):
+    """Run the search; returns (best result, list of all rung results).
+
+    Trials train and validate on the canonical split (dedup.dataset_split),
+    computed once here; its test split stays unseen by the search.
+    """
+    from .cache import PreprocessedCache
+
+    os.makedirs(out_dir, exist_ok=True)
+    # Decode once here and leave a single ordered shard, so each worker gets a zero-copy memmap
+    cache = PreprocessedCache(cache_dir, target_size)
+    data, labels, paths, _ = cache.load(class_dirs)
+    if not isinstance(data, np.memmap):
+        cache.compact(paths)
+    train_idx, val_idx, _ = dataset_split(data, labels, paths, cache, dedup, max_distance)
+
+    num_workers = num_workers or max(1, (os.cpu_count() or 1) // 2)
+    threads = max(1, (os.cpu_count() or 1) // num_workers)
+    budgets = rung_budgets(min_epochs, max_epochs, eta)
+    asha = ASHA(sample_configs(num_trials, space, seed), budgets, eta)
+    results_path = os.path.join(out_dir, 'trials.jsonl')
+    results = []
+    print(f"{num_trials} trials, rungs at {budgets} epochs, {num_workers} workers x {threads} threads")
+
+    start = time.perf_counter()
+    # spawn: TensorFlow does not survive fork() once initialized
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(num_workers, mp_context=context, initializer=_init_worker,
+                             initargs=(cache_dir, class_dirs, target_size, threads,
+                                       train_idx, val_idx)) as executor:
+        running = {}
+
+        def fill():
+            while len(running) < num_workers:
+                job = asha.next_job()
+                if job is None:
+                    return
+                trial, rung = job
+                future = executor.submit(_run_trial, trial, asha.configs[trial], budgets[rung],
+                                         os.path.join(out_dir, f"trial_{trial:03d}"), seed)
+                running[future] = (trial, rung)
+
+        fill()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                trial, rung = running.pop(future)
+                result = future.result()
+                result.update(rung=rung, timestamp=time.strftime('%Y-%m-%dT%H:%M:%S'))
+                asha.report(trial, rung, result['val_loss'])
+                results.append(result)
+                with open(results_path, 'a') as f:
+                    f.write(json.dumps(result) + '\n')
+                print(f"trial {trial:3d} rung {rung} ({result['epochs']:2d} epochs): "
+                      f"val_loss {result['val_loss']:.4f}, val_acc {result['val_accuracy']:.4f}, "
+                      f"{result['seconds']:.0f}s")
+            fill()
+
+    # Best = lowest val_loss among the trials that reached the highest rung anyone reached
+    top_rung = max(result['rung'] for result in results)
+    best = min((r for r in results if r['rung'] == top_rung), key=lambda r: r['val_loss'])
+    summary = {'best': best, 'budgets': budgets, 'eta': eta, 'trials': num_trials,
+               'workers': num_workers, 'wall_seconds': time.perf_counter() - start,
+               'trial_epochs': sum(r['epochs'] - (budgets[r['rung'] - 1] if r['rung'] else 0)
+                                   for r in results),
+               'full_budget_epochs': num_trials * budgets[-1]}
+    with open(os.path.join(out_dir, 'best.json'), 'w') as f:
+        json.dump(summary, f, indent=2)
+    print(f"Best: trial {best['trial']} {best['config']} val_loss {best['val_loss']:.4f} "
+          f"({summary['trial_epochs']} epochs trained vs {summary['full_budget_epochs']} without pruning, "
+          f"{summary['wall_seconds']:.0f}s)")
+    return best, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel ASHA hyperparameter search.")
+    parser.add_argument('data_dir', help="dataset folder with no/ and yes/")
+    parser.add_argument('--cache-dir', required=True, help="PreprocessedCache folder shared by the workers")
+    parser.add_argument('--out-dir', default='search')
+    parser.add_argument('--trials', type=int, default=27)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--min-epochs', type=int, default=2)
+    parser.add_argument('--max-epochs', type=int, default=30)
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--target-size', type=int, default=128)
+    parser.add_argument('--seed', type=int, default=0)
+    add_split_arguments(parser)
+    args = parser.parse_args(argv)
+    run_search(args.cache_dir, [os.path.join(args.data_dir, 'no'), os.path.join(args.data_dir, 'yes')],
+               args.out_dir, args.trials, args.workers, args.min_epochs, args.max_epochs, args.eta,
+               (args.target_size, args.target_size), seed=args.seed, dedup=args.dedup,
+               max_distance=args.dedup_distance)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+"""Local HTTP prediction service with dynamic request batching.
+
+    python -m brain_tumor.serve brain_tumor.keras --port 8080
+    curl --data-binary @scan.jpg http://127.0.0.1:8080/predict
+
+POST /predict takes raw image bytes (like the notebook's predict_image) and
+returns JSON. Concurrent requests are coalesced into micro-batches of up to
+--max-batch-size images, waiting at most --max-wait-ms for a batch to fill.
+GET /metrics returns p50/p95/p99 latency and the batch-size histogram,
+GET /healthz returns 200 once the model is warmed up.
+
+    python -m brain_tumor.serve brain_tumor.keras --load-test 500 --concurrency 16
+
+starts the server on a loopback port and drives it with a local load
+generator (no network access needed).
+"""
+
+import argparse
+import io
+import json
+import queue
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.client import HTTPConnection
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from .data import TARGET_SIZE, load_image
+from .infer import THRESHOLD, load_model, prediction_result
+
+MAX_BATCH_SIZE = 32
+MAX_WAIT_MS = 5.0
+LATENCY_WINDOW = 10000 # requests kept for the latency percentiles
+
+
+class LatencyStats:
+    """Rolling request latencies and a batch-size histogram."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.lock = threading.Lock()
+        self.latencies_ms = deque(maxlen=window)
+        self.batch_sizes = Counter()
+        self.requests = 0
+        self.errors = 0
+
+    def add_request(self, latency_ms, ok=True):
+        with self.lock:
+            self.latencies_ms.append(latency_ms)
+            self.requests += 1
+            self.errors += not ok
+
+    def add_batch(self, size):
+        with self.lock:
+            self.batch_sizes[size] += 1
+
+    def snapshot(self):
+        with self.lock:
+            latencies = np.array(self.latencies_ms, dtype=np.float64)
+            batch_sizes = dict(sorted(self.batch_sizes.items()))
+            requests, errors = self.requests, self.errors
+        result = {'requests': requests, 'errors': errors,
+                  'batch_size_histogram': {str(k): v for k, v in batch_sizes.items()}}
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            result.update(latency_ms={'p50': p50, 'p95': p95, 'p99': p99,
+                                      'mean': float(latencies.mean()), 'max': float(latencies.max())})
+        batches = sum(batch_sizes.values())
+        if batches:
+            result['mean_batch_size'] = sum(k * v for k, v in batch_sizes.items()) / batches
+        return result
+
+
+class DynamicBatcher:
+    """Coalesces single-image submissions into batched predict calls.
+
+    A background thread takes the first waiting image, then keeps collecting
+    until `max_batch_size` images are queued or `max_wait_ms` has passed, and
+    runs `predict_fn` once on the stacked batch.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS, stats=None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.stats = stats if stats is not None else LatencyStats()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='dynamic-batcher', daemon=True)
+        self.thread.start()
+
+    def submit(self, image):
+        """Queue one uint8 image; returns a Future of its probability."""
+        future = Future()
+        self.queue.put((image, future))
+        return future
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _collect(self):
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None) # Finish this batch, stop on the next round
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            images = np.stack([image for image, _ in batch])
+            self.stats.add_batch(len(batch))
+            try:
+                probabilities = np.asarray(self.predict_fn(images)).reshape(-1)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), probability in zip(batch, probabilities):
+                future.set_result(float(probability))
+
+
+def make_predict_fn(model, target_size=TARGET_SIZE):
+    """Compiled uint8 batch -> probability function, traced once for any batch size."""
+    import tensorflow as tf
+
+    @tf.function(input_signature=[tf.TensorSpec([None, target_size[1], target_size[0], 3], tf.uint8)])
+    def predict(images):
+        # Same 0-1 scaling as the training pipeline
+        return model(tf.cast(images, tf.float32) / 255.0, training=False)
+
+    def predict_fn(images):
+        return predict(tf.constant(images)).numpy()
+
+    return predict_fn
+
+
+class PredictionService:
+    """Model + batcher + metrics shared by the HTTP handler threads."""
+
+    def __init__(self, predict_fn, target_size=TARGET_SIZE, max_batch_size=MAX_BATCH_SIZE,
+                 max_wait_ms=MAX_WAIT_MS, threshold=THRESHOLD):
+        self.target_size = tuple(target_size)
+        self.threshold = threshold
+        self.stats = LatencyStats()
+        self.ready = False
+        self.warm_up(predict_fn, max_batch_size)
+        self.batcher = DynamicBatcher(predict_fn, max_batch_size, max_wait_ms, self.stats)
+
+    def warm_up(self, predict_fn, max_batch_size):
+        # Trace the graph and touch both batch-size extremes before the first request
+        start = time.perf_counter()
+        for size in sorted({1, max_batch_size}):
+            predict_fn(np.zeros((size, self.target_size[1], self.target_size[0], 3), dtype=np.uint8))
+        self.ready = True
+        print(f"Model warmed up in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+    def predict_bytes(self, image_bytes):
+        """Decode, preprocess and predict one uploaded image; returns a result dict."""
+        img_array, error, _ = load_image(io.BytesIO(image_bytes), self.target_size)
+        if img_array is None:
+            raise ValueError(error)
+        return prediction_result(self.batcher.submit(img_array).result(), self.threshold)
+
+    def close(self):
+        self.batcher.close()
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    service = None # set by make_server()
+    protocol_version = 'HTTP/1.1'
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self._send_json(200, self.service.stats.snapshot())
+        elif self.path == '/healthz':
+            self._send_json(200 if self.service.ready else 503, {'ready': self.service.ready})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self._send_json(404, {'error': 'not found'})
+            return
+        start = time.perf_counter()
+        image_bytes = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            result = self.service.predict_bytes(image_bytes)
+        except Exception as e:
+            self.service.stats.add_request(1000.0 * (time.perf_counter() - start), ok=False)
+            self._send_json(400, {'error': f"Error processing image or making prediction: {e}"})
+            return
+        self.service.stats.add_request(1000.0 * (time.perf_counter() - start))
+        self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        pass # Per-request access logs would dominate the latency at high QPS
+
+
+def make_server(service, host='127.0.0.1', port=8080):
+    handler = type('BoundPredictionHandler', (PredictionHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def run_load_test(host, port, payloads, total_requests=500, concurrency=16):
+    """Fire `total_requests` POST /predict calls from `concurrency` client threads.
+
+    Returns client-side {'requests_per_sec', 'errors', 'latency_ms': {...}}.
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(n):
+        nonlocal errors
+        connection = HTTPConnection(host, port)
+        for i in range(n):
+            body = payloads[i % len(payloads)]
+            start = time.perf_counter()
+            connection.request('POST', '/predict', body=body,
+                               headers={'Content-Type': 'application/octet-stream'})
+            response = connection.getresponse()
+            response.read()
+            with lock:
+                latencies.append(1000.0 * (time.perf_counter() - start))
+                errors += response.status != 200
+        connection.close()
+
+    per_worker = [total_requests // concurrency + (i < total_requests % concurrency)
+                  for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, per_worker))
+    elapsed = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {'requests_per_sec': total_requests / elapsed, 'errors': errors,
+            'latency_ms': {'p50': p50, 'p95': p95, 'p99': p99}}
+
+
+def synthetic_payloads(count=16, size=(256, 256), seed=0):
+    """JPEG-encoded random scans for load testing."""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    payloads = []
+    for _ in range(count):
+        buffer = io.BytesIO()
+        Image.fromarray(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)).save(buffer, 'JPEG')
+        payloads.append(buffer.getvalue())
+    return payloads
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve brain tumor predictions over HTTP.")
+    parser.add_argument('model', help="saved Keras model (.keras)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-batch-size', type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS)
+    parser.add_argument('--target-size', type=int, default=TARGET_SIZE[0])
+    parser.add_argument('--load-test', type=int, metavar='N', default=0,
+                        help="serve on a loopback port, send N requests, print metrics and exit")
+    parser.add_argument('--concurrency', type=int, default=16, help="load-test client threads")
+    args = parser.parse_args(argv)
+
+    target_size = (args.target_size, args.target_size)
+    model = load_model(args.model)
+    service = PredictionService(make_predict_fn(model, target_size), target_size,
+                                args.max_batch_size, args.max_wait_ms)
+    server = make_server(service, args.host, 0 if args.load_test else args.port)
+    host, port = server.server_address[:2]
+
+    if not args.load_test:
+        print(f"Serving on http://{host}:{port} (POST /predict, GET /metrics)", file=sys.stderr)
+        try:
+            server.serve_forever()
+        finally:
+            service.close()
+        return
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        client = run_load_test(host, port, synthetic_payloads(), args.load_test, args.concurrency)
+    finally:
+        server.shutdown()
+        service.close()
+    print(json.dumps({'client': client, 'server': service.stats.snapshot()}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Training helpers: precision/XLA modes and per-epoch timing."""
+
+import time
+
+import tensorflow as tf
+
+TRAINING_MODES = {
+    # name: (precision, jit_compile)
+    'float32': ('float32', False),
+    'float32_xla': ('float32', True),
+    'bfloat16': ('mixed_bfloat16', False),
+    'bfloat16_xla': ('mixed_bfloat16', True),
+}
+
+
+def cpu_supports_bf16():
+    """True if the CPU has native bfloat16 instructions (AVX512-BF16 or AMX-BF16).
+
+    Without them bfloat16 math is emulated and usually slower than float32.
+    """
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return 'avx512_bf16' in flags or 'amx_bf16' in flags
+
+
+def resolve_training_mode(mode):
+    """(precision, jit_compile) for a TRAINING_MODES name, warning about emulated bf16."""
+    if mode not in TRAINING_MODES:
+        raise ValueError(f"Unknown training mode {mode!r}, expected one of {tuple(TRAINING_MODES)}")
+    precision, jit_compile = TRAINING_MODES[mode]
+    if precision == 'mixed_bfloat16' and not cpu_supports_bf16() and not tf.config.list_physical_devices('GPU'):
+        print("Warning: this CPU has no native bfloat16 support; mixed_bfloat16 will be emulated.")
+    return precision, jit_compile
+
+
+class EpochTimeLogger(tf.keras.callbacks.Callback):
+    """Logs wall time per epoch (also into the History as 'epoch_seconds')."""
+
+    def __init__(self, label=''):
+        super().__init__()
+        self.label = label
+        self.epoch_seconds = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        seconds = time.perf_counter() - self._start
+        self.epoch_seconds.append(seconds)
+        if logs is not None:
+            logs['epoch_seconds'] = seconds
+        prefix = f"[{self.label}] " if self.label else ""
+        print(f"{prefix}Epoch {epoch + 1}: {seconds:.2f}s wall time")
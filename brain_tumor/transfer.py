@@ -0,0 +1,275 @@
+"""Transfer learning on a frozen pretrained backbone with cached features.
+
+A frozen backbone computes the same features for an image every epoch, so
+they are extracted once, in batches, into a float32 .npy memmap under
+`feature_dir`; the head (Dense(128) + Dropout + sigmoid, as in the CNN)
+then trains on those rows in a fraction of the time of a full forward pass.
+An optional fine-tuning phase afterwards unfreezes the top layers of the
+backbone and trains backbone + head end to end on the (augmented) images at
+a low learning rate.
+
+Backbone weights are read from a local file (the Keras applications
+"no top" .h5 for that backbone); nothing is downloaded. weights=None builds
+a randomly initialized backbone, which is only useful for timing.
+
+    python -m brain_tumor.transfer "NN Dataset" --backbone mobilenet_v2 \\
+        --weights mobilenet_v2_weights_tf_dim_ordering_tf_kernels_1.0_128_no_top.h5 \\
+        --cache-dir /tmp/cache --fine-tune-epochs 5 --out brain_tumor_transfer.keras
+
+The features of a dataset are keyed by backbone, weights file, image shape
+and the list of image paths with each file's size and mtime, so a rerun on
+the same images skips the extraction while an edited or replaced scan
+triggers a new one. Writing a new feature file removes the one it
+supersedes (same backbone, weights path and image shape). The saved model
+takes 0-1 float images like the scratch CNN, so brain_tumor.infer and serve
+use it unchanged. Frozen-feature training sees no augmentation (the
+features are fixed); fine-tuning does.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from .pipeline import BATCH_SIZE
+
+BACKBONES = {
+    # name: (tf.keras.applications class, scale, offset) mapping 0-1 pixels to the backbone's input range
+    'mobilenet_v2': ('MobileNetV2', 2.0, -1.0),
+    'resnet50_v2': ('ResNet50V2', 2.0, -1.0),
+    'efficientnet_b0': ('EfficientNetB0', 255.0, 0.0),
+}
+HEAD_UNITS = 128
+FINE_TUNE_LAYERS = 20 # Top backbone layers unfrozen for fine-tuning
+FINE_TUNE_LEARNING_RATE = 1e-5
+
+
+def build_backbone(name='mobilenet_v2', weights=None, input_shape=(128, 128, 3)):
+    """Headless backbone (global average pooled features) taking 0-1 float images.
+
+    `weights` is a local weights file; None leaves the backbone randomly
+    initialized.
+    """
+    import tensorflow as tf
+
+    if name not in BACKBONES:
+        raise ValueError(f"Unknown backbone {name!r}, expected one of {tuple(BACKBONES)}")
+    if weights is not None and not os.path.isfile(weights):
+        raise FileNotFoundError(f"Backbone weights file not found: {weights} (weights are never downloaded)")
+    application_name, scale, offset = BACKBONES[name]
+    application = getattr(tf.keras.applications, application_name)(
+        include_top=False, weights=weights, input_shape=input_shape, pooling='avg')
+    inputs = tf.keras.Input(shape=input_shape)
+    features = application(tf.keras.layers.Rescaling(scale, offset)(inputs))
+    return tf.keras.Model(inputs, features, name=f"{name}_backbone")
+
+
+def build_head(feature_dim, l2=0.01, dropout=0.6):
+    """The CNN's classifier head on a feature vector: Dense(128) + Dropout + sigmoid."""
+    import tensorflow as tf
+    from tensorflow.keras import regularizers
+    from tensorflow.keras.layers import Dense, Dropout, Input
+
+    return tf.keras.Sequential([
+        Input(shape=(feature_dim,)),
+        Dense(HEAD_UNITS, activation='relu', kernel_regularizer=regularizers.l2(l2)),
+        Dropout(dropout),
+        Dense(1, activation='sigmoid'),
+    ], name='transfer_head')
+
+
+def feature_key(backbone_name, weights, image_shape, paths):
+    """Cache key of the features of `paths` under a backbone and weights file.
+
+    '{backbone}_{setup}_{content}': `setup` hashes the weights path and image
+    shape, `content` the weights file's and every image's path, size and
+    mtime. Keys differing only in `content` supersede each other.
+    """
+    weights_path = os.path.abspath(weights) if weights is not None else None
+    setup = hashlib.sha1(json.dumps([weights_path, list(image_shape)]).encode()).hexdigest()[:8]
+    content = hashlib.sha1()
+    for path in ([weights] if weights is not None else []) + list(paths):
+        stat = os.stat(path)
+        content.update(os.fsencode(path) + f"\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return f"{backbone_name}_{setup}_{content.hexdigest()[:16]}"
+
+
+def extract_features(backbone, data, feature_dir, key, batch_size=BATCH_SIZE):
+    """(N, D) float32 memmap of the backbone features of every row of uint8 `data`.
+
+    Computed once, batch by batch, straight into the memmap (temp file +
+    os.replace, like the preprocessed cache); later calls with the same key
+    only map the file. A new file replaces those of the keys it supersedes
+    (see feature_key).
+    """
+    import tensorflow as tf
+
+    from .pipeline import normalize_images
+
+    path = os.path.join(feature_dir, f"features_{key}.npy")
+    if os.path.exists(path):
+        return np.load(path, mmap_mode='r')
+    os.makedirs(feature_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    @tf.function(input_signature=[tf.TensorSpec((None,) + tuple(data.shape[1:]), tf.uint8)])
+    def features_of(images):
+        return backbone(normalize_images(images), training=False)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    features = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32,
+                                         shape=(len(data), backbone.output_shape[-1]))
+    for i in range(0, len(data), batch_size):
+        features[i:i + batch_size] = features_of(np.asarray(data[i:i + batch_size])).numpy()
+    features.flush()
+    del features
+    os.replace(tmp_path, path)
+    superseded = f"features_{key.rsplit('_', 1)[0]}_"
+    for name in os.listdir(feature_dir):
+        if name.startswith(superseded) and name.endswith('.npy') and name != os.path.basename(path):
+            os.remove(os.path.join(feature_dir, name))
+    print(f"Extracted {len(data)} feature vectors to {path} in {time.perf_counter() - start:.1f}s")
+    return np.load(path, mmap_mode='r')
+
+
+def make_feature_dataset(features, labels, indices, batch_size=BATCH_SIZE, shuffle=False, seed=None):
+    """Batched (features, labels) dataset reading rows `indices` of the feature memmap."""
+    import tensorflow as tf
+
+    indices = np.asarray(indices, dtype=np.int64)
+    labels = np.asarray(labels)
+
+    def gather(batch_indices):
+        return np.asarray(features[batch_indices]), labels[batch_indices].astype(np.float32)
+
+    def load_batch(batch_indices):
+        batch_features, batch_labels = tf.numpy_function(gather, [batch_indices], (tf.float32, tf.float32))
+        batch_features.set_shape((None, features.shape[1]))
+        batch_labels.set_shape((None,))
+        return batch_features, batch_labels
+
+    dataset = tf.data.Dataset.from_tensor_slices(indices)
+    if shuffle:
+        dataset = dataset.shuffle(buffer_size=len(indices), seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size).map(load_batch, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+
+def unfreeze_top(backbone, num_layers=FINE_TUNE_LAYERS):
+    """Make the top `num_layers` layers of the backbone trainable, BatchNormalization excepted.
+
+    Frozen BatchNormalization layers keep using their pretrained statistics,
+    which small fine-tuning batches would otherwise overwrite.
+    """
+    import tensorflow as tf
+
+    application = backbone.layers[-1]
+    backbone.trainable = True
+    for i, layer in enumerate(application.layers):
+        layer.trainable = (i >= len(application.layers) - num_layers
+                           and not isinstance(layer, tf.keras.layers.BatchNormalization))
+
+
+def train_transfer(data, labels, train_idx, val_idx, paths=None, backbone_name='mobilenet_v2',
+                   weights=None, feature_dir='features', epochs=20, fine_tune_epochs=0,
+                   fine_tune_layers=FINE_TUNE_LAYERS, batch_size=BATCH_SIZE, l2=0.01, dropout=0.6,
+                   callbacks=(), seed=None):
+    """Train a head on cached backbone features, then optionally fine-tune; returns (model, report).
+
+    `paths` (one per row of `data`, e.g. from PreprocessedCache.load) name
+    the feature cache; without them the features are recomputed every call.
+    `callbacks` (e.g. EarlyStopping) apply to the head phase. The returned
+    model is backbone + head on 0-1 float images. The report holds the
+    extraction time, per-epoch times and the History of each phase.
+    """
+    import tempfile
+
+    import tensorflow as tf
+
+    from .model import compile_model
+    from .pipeline import make_dataset
+    from .train import EpochTimeLogger
+
+    if weights is None:
+        print("Warning: no backbone weights given; the backbone is randomly initialized.")
+    backbone = build_backbone(backbone_name, weights, tuple(data.shape[1:]))
+    backbone.trainable = False
+    report = {'backbone': backbone_name, 'weights': weights, 'feature_dim': int(backbone.output_shape[-1])}
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix='brain_tumor_features_') as tmp_dir:
+        if paths is None:
+            feature_dir, key = tmp_dir, 'uncached'
+        else:
+            key = feature_key(backbone_name, weights, data.shape[1:], paths)
+        features = extract_features(backbone, data, feature_dir, key, batch_size)
+        report['extract_seconds'] = time.perf_counter() - start
+
+        head = compile_model(build_head(features.shape[1], l2, dropout))
+        timer = EpochTimeLogger('head')
+        history = head.fit(make_feature_dataset(features, labels, train_idx, batch_size, shuffle=True, seed=seed),
+                           validation_data=make_feature_dataset(features, labels, val_idx, batch_size),
+                           epochs=epochs, callbacks=[*callbacks, timer], verbose=0)
+        del features # Release the memmap before the temporary directory goes
+    report.update(head_epoch_seconds=timer.epoch_seconds, head_history=history.history)
+
+    inputs = tf.keras.Input(shape=data.shape[1:])
+    model = tf.keras.Model(inputs, head(backbone(inputs, training=False)), name=f"brain_tumor_{backbone_name}")
+    if fine_tune_epochs:
+        unfreeze_top(backbone, fine_tune_layers)
+        compile_model(model, optimizer=tf.keras.optimizers.Adam(FINE_TUNE_LEARNING_RATE))
+        timer = EpochTimeLogger('fine-tune')
+        history = model.fit(make_dataset(data, labels, train_idx, batch_size, shuffle=True, augment=True, seed=seed),
+                            validation_data=make_dataset(data, labels, val_idx, batch_size),
+                            epochs=fine_tune_epochs, callbacks=[timer], verbose=0)
+        report.update(fine_tune_epoch_seconds=timer.epoch_seconds, fine_tune_history=history.history)
+        backbone.trainable = False
+    compile_model(model)
+    return model, report
+
+
+def main(argv=None):
+    from .dedup import add_split_arguments, dataset_split
+
+    parser = argparse.ArgumentParser(description="Train a classifier head on cached pretrained-backbone features.")
+    parser.add_argument('data_dir', help="dataset folder with no/ and yes/")
+    parser.add_argument('--backbone', choices=tuple(BACKBONES), default='mobilenet_v2')
+    parser.add_argument('--weights', help="local no-top weights file of the backbone (default: random init)")
+    parser.add_argument('--cache-dir', help="PreprocessedCache folder (default: decode the images)")
+    parser.add_argument('--feature-dir', default='features')
+    parser.add_argument('--epochs', type=int, default=20, help="head epochs on the cached features")
+    parser.add_argument('--fine-tune-epochs', type=int, default=0)
+    parser.add_argument('--fine-tune-layers', type=int, default=FINE_TUNE_LAYERS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--target-size', type=int, default=128)
+    parser.add_argument('--out', default='brain_tumor_transfer.keras')
+    add_split_arguments(parser)
+    args = parser.parse_args(argv)
+
+    from .cache import PreprocessedCache
+    from .data import load_image_folders
+    from .evaluate import evaluate_model, print_evaluation
+    from .pipeline import make_dataset
+
+    class_dirs = [os.path.join(args.data_dir, 'no'), os.path.join(args.data_dir, 'yes')]
+    target_size = (args.target_size, args.target_size)
+    cache = PreprocessedCache(args.cache_dir, target_size) if args.cache_dir else None
+    if cache is not None:
+        data, labels, paths, _ = cache.load(class_dirs)
+    else:
+        data, labels, paths, _ = load_image_folders(class_dirs, target_size)
+    train_idx, val_idx, test_idx = dataset_split(data, labels, paths, cache, args.dedup, args.dedup_distance)
+    model, report = train_transfer(data, labels, train_idx, val_idx, paths, args.backbone, args.weights,
+                                   args.feature_dir, args.epochs, args.fine_tune_epochs,
+                                   args.fine_tune_layers, args.batch_size)
+    model.save(args.out)
+    print(f"Model saved to {args.out} (feature extraction {report['extract_seconds']:.1f}s)")
+    result, _ = evaluate_model(model, make_dataset(data, labels, test_idx, args.batch_size))
+    print_evaluation(result)
+
+
+if __name__ == '__main__':
+    main()
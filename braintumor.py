@@ -58,9 +58,13 @@ To prevent overfitting and improve model generalization, especially with limited
 import os # Import the os module
 from PIL import Image # Import the Image module from PIL
 import numpy as np # Import numpy
-from sklearn.model_selection import train_test_split # Import train_test_split
 import tensorflow as tf # Import tensorflow
 from google.colab import drive # Import drive to mount Google Drive
+from brain_tumor.data import load_image_folders # Parallel image loader (repo must be on sys.path)
+from brain_tumor.cache import PreprocessedCache # On-disk cache of resized images
+from brain_tumor.pipeline import make_dataset, balance_report, class_weights # Index-based splits and uint8 tf.data pipelines
+from brain_tumor.resources import peak_rss_mb # Peak memory reporting
+from brain_tumor.dedup import dataset_split # Canonical train/val/test split with near-duplicate handling
 
 
 # Redefine paths if necessary based on your actual /content structure
@@ -71,65 +75,35 @@ yes_tumor_path = '/content/drive/MyDrive/NN Dataset/yes'
 TARGET_SIZE = (128, 128) # Define if not in current scope
 BATCH_SIZE = 128 # Define if not in current scope
 
-# Lists to store processed images and their labels
-data = []
-labels = [] # 0 for 'no_tumor', 1 for 'yes_tumor'
+# Number of decode/resize workers (None = one per CPU core)
+NUM_LOAD_WORKERS = None
+# Cache of resized images; reruns only decode new or changed files. Set to None to disable.
+CACHE_DIR = '/content/drive/MyDrive/NN Dataset/.cache'
+# Near-duplicate scans (perceptual hash within DEDUP_DISTANCE of 64 bits) would leak across splits:
+# 'group' keeps each group of copies in one split, 'drop' keeps one image per group, None ignores them.
+DEDUP = 'group'
+DEDUP_DISTANCE = 4
+# Class imbalance: 'sample' resamples the training batches to CLASS_RATIO (no:yes), 'weights' passes the
+# equivalent class weights to model.fit, None trains on the natural distribution. Images are never copied.
+BALANCE = None
+CLASS_RATIO = (1, 1)
 
 print("--- Starting Data Cleaning & Transformation (Reading new paths) ---")
 
 # --- CRISP-DM: Data Cleaning (Image Loading and Preprocessing) ---
-# Load and preprocess images from 'no_tumor' folder (label 0)
-print(f"\nProcessing images from 'no tumor' folder: {no_tumor_path}")
-if os.path.exists(no_tumor_path):
-    num_no_tumor_images = 0
-    for filename in os.listdir(no_tumor_path):
-        if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-            img_path = os.path.join(no_tumor_path, filename)
-            try:
-                img = Image.open(img_path).convert('RGB')
-                img = img.resize(TARGET_SIZE)
-                img_array = np.array(img) / 255.0 # Normalize pixel values to 0-1
-
-                if img_array.shape == (TARGET_SIZE[0], TARGET_SIZE[1], 3):
-                    data.append(img_array)
-                    labels.append(0)
-                    num_no_tumor_images += 1
-                else:
-                    print(f"Warning: Skipping {img_path} due to unexpected shape: {img_array.shape}")
-            except Exception as e:
-                print(f"Error: Could not process image {img_path}: {e}")
-    print(f"Successfully loaded {num_no_tumor_images} images from '{no_tumor_path}'.")
-else:
-    print(f"Error: 'no tumor' folder '{no_tumor_path}' not found. Check path and contents.")
-
-
-# Load and preprocess images from 'yes_tumor' folder (label 1)
-print(f"\nProcessing images from 'yes tumor' folder: {yes_tumor_path}")
-if os.path.exists(yes_tumor_path):
-    num_yes_tumor_images = 0
-    for filename in os.listdir(yes_tumor_path):
-        if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-            img_path = os.path.join(yes_tumor_path, filename)
-            try:
-                img = Image.open(img_path).convert('RGB')
-                img = img.resize(TARGET_SIZE)
-                img_array = np.array(img) / 255.0
-
-                if img_array.shape == (TARGET_SIZE[0], TARGET_SIZE[1], 3):
-                    data.append(img_array)
-                    labels.append(1)
-                    num_yes_tumor_images += 1
-                else:
-                    print(f"Warning: Skipping {img_path} due to unexpected shape: {img_array.shape}")
-            except Exception as e:
-                print(f"Error: Could not process image {img_path}: {e}")
-    print(f"Successfully loaded {num_yes_tumor_images} images from '{yes_tumor_path}'.")
+# Load and preprocess images from the 'no_tumor' (label 0) and 'yes_tumor' (label 1) folders.
+# Decoding and resizing run in a worker pool; corrupt files are skipped and reported.
+print(f"\nProcessing images from: {no_tumor_path}, {yes_tumor_path}")
+cache = PreprocessedCache(CACHE_DIR, TARGET_SIZE) if CACHE_DIR else None
+if cache is not None:
+    data, labels, image_paths, load_report = cache.load(
+        [no_tumor_path, yes_tumor_path], num_workers=NUM_LOAD_WORKERS
+    )
 else:
-    print(f"Error: 'yes tumor' folder '{yes_tumor_path}' not found. Check path and contents.")
-
-# Convert lists to NumPy arrays
-data = np.array(data)
-labels = np.array(labels)
+    data, labels, image_paths, load_report = load_image_folders(
+        [no_tumor_path, yes_tumor_path], target_size=TARGET_SIZE, num_workers=NUM_LOAD_WORKERS
+    )
+print(load_report.summary())
 
 print(f"\n--- Data Loading Summary (from new paths) ---")
 print(f"Total images loaded: {len(data)}")
@@ -145,7 +119,7 @@ if len(data) > 0:
     if 0 in class_distribution and 1 in class_distribution:
         if class_distribution[0] != class_distribution[1]:
             print("Note: The dataset is imbalanced. This might affect model training and evaluation.")
-            print("Consider using techniques like oversampling, undersampling, or class weighting during training.")
+            print("Set BALANCE = 'sample' or 'weights' (target ratio CLASS_RATIO) to rebalance training.")
     else:
         print("Warning: One or both classes might be missing from the loaded data.")
 
@@ -153,47 +127,28 @@ if len(data) > 0:
     print("\n--- Splitting Data into Training, Validation, and Test Sets ---")
     # Ensure there's enough data for splitting
     if len(data) >= 2: # Need at least two samples to split
-        X_train_val, X_test, y_train_val, y_test = train_test_split(
-            data, labels, test_size=0.2, random_state=42, stratify=labels
-        )
-        print(f"Initial split: {len(X_train_val)} for Train+Validation, {len(X_test)} for Test.")
-
-        # Ensure there's enough data in the train_val set for the second split
-        if len(X_train_val) >= 2:
-            X_train, X_val, y_train, y_val = train_test_split(
-                X_train_val, y_train_val, test_size=0.25, random_state=49, stratify=y_train_val # Changed random_state to 49 for the second split to avoid potential issues with same seed
-            )
-            print(f"Final split: {len(X_train)} for Training, {len(X_val)} for Validation, {len(X_test)} for Testing.")
-
-            print(f"\nTraining data shape: {X_train.shape}")
-            print(f"Validation data shape: {X_val.shape}")
-            print(f"Testing data shape: {X_test.shape}")
-            print(f"Training labels shape: {y_train.shape}")
-            print(f"Validation labels shape: {y_val.shape}")
-            print(f"Testing labels shape: {y_test.shape}")
-
-            # --- NEW: Convert NumPy arrays to tf.data.Dataset objects for optimized input ---
-            print("\n--- Converting data to tf.data.Dataset for optimized pipeline ---")
-            AUTOTUNE = tf.data.AUTOTUNE # Automatically tune buffer sizes
-
-            # Create datasets from your NumPy arrays
-            train_dataset = tf.data.Dataset.from_tensor_slices((X_train, y_train))
-            val_dataset = tf.data.Dataset.from_tensor_slices((X_val, y_val))
-            test_dataset = tf.data.Dataset.from_tensor_slices((X_test, y_test)) # Create for testing as well if you like
-
-            # Apply shuffling, batching, caching, and prefetching for performance
-            # Shuffling is only for training data to improve generalization
-            train_dataset = train_dataset.shuffle(buffer_size=1024) # Shuffle buffer size
-            train_dataset = train_dataset.batch(BATCH_SIZE).cache().prefetch(buffer_size=AUTOTUNE)
-
-            val_dataset = val_dataset.batch(BATCH_SIZE).cache().prefetch(buffer_size=AUTOTUNE)
-            test_dataset = test_dataset.batch(BATCH_SIZE).cache().prefetch(buffer_size=AUTOTUNE) # For evaluation later
-
-            print(f"tf.data.Dataset objects created for training, validation, and testing.")
-            print("These datasets are now optimized for performance.")
+        # Split index arrays rather than the images: every set reads rows of the one uint8 `data` array
+        # 20% test, then 25% of the rest for validation; with 'group', copies never span two splits.
+        # The same split as every brain_tumor command line; the cache keeps the image hashes.
+        # A class with fewer than 2 images (in all data or in train+validation) stops here with a ValueError.
+        train_idx, val_idx, test_idx = dataset_split(data, labels, image_paths, cache, DEDUP, DEDUP_DISTANCE)
+        y_train, y_val, y_test = labels[train_idx], labels[val_idx], labels[test_idx]
+        print(f"Final split: {len(train_idx)} for Training, {len(val_idx)} for Validation, {len(test_idx)} for Testing.")
+
+        print(f"\nTraining labels shape: {y_train.shape}")
+        print(f"Validation labels shape: {y_val.shape}")
+        print(f"Testing labels shape: {y_test.shape}")
+
+        # --- NEW: Build tf.data.Dataset objects for optimized input ---
+        print("\n--- Building tf.data.Dataset pipelines ---")
+        # Batches are gathered from the uint8 array and normalized to float32 in the map stage
+        train_dataset = make_dataset(data, labels, train_idx, BATCH_SIZE, shuffle=True) # Reshuffled every epoch
+        val_dataset = make_dataset(data, labels, val_idx, BATCH_SIZE)
+        test_dataset = make_dataset(data, labels, test_idx, BATCH_SIZE) # For evaluation later
+
+        print(f"tf.data.Dataset objects created for training, validation, and testing.")
+        print(f"Image data: {data.dtype}, {data.nbytes / 1024**2:.1f} MiB. Peak RSS so far: {peak_rss_mb():.1f} MiB")
 
-        else:
-             print("Not enough data in the train+validation set to perform the second split.")
     else:
          print("Not enough data loaded to perform train/validation/test split.")
 
@@ -212,49 +167,34 @@ Transfer Learning (Recommended): For medical image analysis and limited datasets
 
 # Modeling
 import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Conv2D, MaxPooling2D, Flatten, Dense, Dropout
 from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau # Make sure both are imported
-from tensorflow.keras import regularizers # Import regularizers for L2
+from brain_tumor.model import build_model, compile_model # The Sequential CNN
+from brain_tumor.train import resolve_training_mode, EpochTimeLogger # Precision/XLA modes, epoch timing
+from brain_tumor.export import export_all # Save/export with post-training quantization
+from brain_tumor.checkpoint import TrainingCheckpoint # Resumable training after a disconnect
+from brain_tumor.profiling import StepProfiler # Step times, memory, LR; input wait vs compute per epoch
 import matplotlib.pyplot as plt
 import numpy as np
-from tensorflow.keras.preprocessing.image import ImageDataGenerator # Import ImageDataGenerator
-# from tensorflow.keras.applications import VGG16 # For transfer learning example
+from brain_tumor.transfer import train_transfer # Pretrained backbone, head trained on cached features
 
 # Check if data was loaded and split successfully
-if 'X_train' in locals() and X_train.size > 0:
-    # Define your CNN model with L2 regularization
-    model = Sequential([
-    # Convolutional Layer 1 with L2 regularization
-    Conv2D(32, (3, 3), activation='relu', input_shape=X_train.shape[1:],
-           kernel_regularizer=regularizers.l2(0.01)), # L2 regularization applied to weights
-    MaxPooling2D((2, 2)),
-
-    # Convolutional Layer 2 (you can add L2 here too if desired)
-    Conv2D(64, (3, 3), activation='relu'),
-    MaxPooling2D((2, 2)),
-
-    # Convolutional Layer 3 (you can add L2 here too if desired)
-    Conv2D(128, (3, 3), activation='relu'),
-    MaxPooling2D((2, 2)),
-
-    Flatten(),
-
-    # Dense Layer with L2 regularization
-    Dense(128, activation='relu',
-          kernel_regularizer=regularizers.l2(0.01)), # L2 regularization applied to weights\
-    ### DROP VALUE ####
-    Dropout(0.6),
-
-    # Output Layer
-    Dense(1, activation='sigmoid')
-])
-
-
-    # Compile the model
-    model.compile(optimizer='adam',
-                  loss='binary_crossentropy', # For binary classification
-                  metrics=['accuracy'])
+if 'train_idx' in locals() and train_idx.size > 0:
+    # Define your CNN model with L2 regularization (see brain_tumor.model for the layer stack)
+    # ARCHITECTURE: 'flatten' (original), 'gap' (GlobalAveragePooling, ~30x fewer parameters)
+    # or 'separable' (gap + depthwise-separable convs; smallest and fastest on CPU)
+    ARCHITECTURE = 'flatten'
+    # TRAINING_MODE: 'float32' (default), 'float32_xla', 'bfloat16' or 'bfloat16_xla'.
+    # bfloat16 pays off on CPUs with AVX512-BF16/AMX; XLA (jit_compile) adds compile time to epoch 1.
+    TRAINING_MODE = 'float32'
+    precision, jit_compile = resolve_training_mode(TRAINING_MODE)
+    model = build_model(input_shape=data.shape[1:],
+                        l2=0.01,      # L2 regularization applied to the first conv and the dense weights
+                        dropout=0.6,  ### DROP VALUE ####
+                        architecture=ARCHITECTURE,
+                        precision=precision) # Output layer stays float32 in every mode
+
+    # Compile the model: adam, binary_crossentropy (for binary classification), accuracy
+    compile_model(model, jit_compile=jit_compile)
 
     # Display model summary
     model.summary()
@@ -272,28 +212,74 @@ if 'X_train' in locals() and X_train.size > 0:
     verbose=1           # Print a message when LR is reduced
     )
 
-    # Set up data augmentation
-    datagen = ImageDataGenerator(
-        rotation_range=15,      # Random rotations up to 15 degrees
-        zoom_range=0.1,         # Random zoom up to 10%
-        width_shift_range=0.1,  # Random horizontal shifts up to 10%
-        height_shift_range=0.1, # Random vertical shifts up to 10%
-        horizontal_flip=True,   # Random horizontal flips
-        vertical_flip=False     # Generally not recommended for brain images
-    )
-
-    # Fit the data generator on your training data
-    datagen.fit(X_train)
-
-    # Train the model using the data generator
+    # Data augmentation runs as a batched tf.data stage (see brain_tumor.augment):
+    # rotation 15 degrees, zoom 0.1, width/height shifts 0.1, horizontal flips, no vertical flips
+    # (vertical flips are generally not recommended for brain images)
+    augmented_train_dataset = make_dataset(data, labels, train_idx, BATCH_SIZE, shuffle=True, augment=True,
+                                           balance=CLASS_RATIO if BALANCE == 'sample' else None)
+    if BALANCE:
+        for c, row in balance_report(labels[train_idx], CLASS_RATIO).items():
+            print(f"Class {c}: {row['count']} training images, share {row['natural_fraction']:.3f} -> "
+                  f"{row['target_fraction']:.3f} ({row['draws_per_image']:.2f} " +
+                  ("draws per image per epoch)" if BALANCE == 'sample' else "class weight)"))
+
+    # Checkpoint model, optimizer, callback state and history after every epoch (written in the
+    # background). After a Colab disconnect, rerunning the cells resumes from the last epoch;
+    # delete CHECKPOINT_DIR to start a fresh run.
+    CHECKPOINT_DIR = '/content/drive/MyDrive/NN Dataset/checkpoints'
+    checkpoint = TrainingCheckpoint(CHECKPOINT_DIR, [early_stopping, reduce_lr])
+    initial_epoch = checkpoint.restore(model) # 0 on a fresh run
+
+    # Optional profiling: per-step times, images/sec, memory and learning rate, plus each epoch's input
+    # wait vs compute time, written as JSON lines and Prometheus text to PROFILE_DIR, e.g.
+    # '/content/drive/MyDrive/NN Dataset/profile' (None = off). PROFILE_TRACE_STEPS=(start, stop) also
+    # records a TensorFlow profiler trace of those steps for TensorBoard.
+    PROFILE_DIR = None
+    PROFILE_TRACE_STEPS = None
+    profile_callbacks = []
+    if PROFILE_DIR:
+        profiler = StepProfiler(PROFILE_DIR, trace_steps=PROFILE_TRACE_STEPS)
+        augmented_train_dataset = profiler.instrument(augmented_train_dataset)
+        profile_callbacks.append(profiler)
+
+    # Train the model on the augmented tf.data pipeline
     print("\nStarting model training with Data Augmentation...")
-    history = model.fit(datagen.flow(X_train, y_train, batch_size=BATCH_SIZE),
-                        steps_per_epoch=len(X_train) // BATCH_SIZE, # Number of batches per epoch
-                        epochs=30, # You might need more epochs with augmentation
-                        validation_data=(X_val, y_val), # Use your validation data here!
-                        callbacks=[early_stopping, reduce_lr]) # Add reduce_lr callback here
+    history = model.fit(augmented_train_dataset,
+                        epochs=0 if checkpoint.finished else 30, # You might need more epochs with augmentation
+                        initial_epoch=initial_epoch,
+                        validation_data=val_dataset, # Use your validation data here!
+                        class_weight=class_weights(labels[train_idx], CLASS_RATIO) if BALANCE == 'weights' else None,
+                        callbacks=[early_stopping, reduce_lr, # Add reduce_lr callback here
+                                   EpochTimeLogger(TRAINING_MODE), # Per-epoch wall time for this mode
+                                   *profile_callbacks,
+                                   checkpoint]) # Keep last: saves the state the other callbacks left
+    history.history = checkpoint.history # Curves over the whole run, including epochs before a resume
 
     print("\nModel training complete.")
+
+    # Save the trained model so deployments do not need to retrain, and export
+    # SavedModel + TFLite (float32, dynamic-range and int8 calibrated on validation images).
+    # The comparison of size, CPU latency and test accuracy/AUC is written next to the exports.
+    EXPORT_DIR = '/content/drive/MyDrive/NN Dataset/export'
+    export_report = export_all(model, EXPORT_DIR, calibration_images=data[val_idx],
+                               test_images=data[test_idx], test_labels=y_test)
+
+    # Transfer learning (optional): set BACKBONE_WEIGHTS to a local Keras "no top" weights file for
+    # BACKBONE (copied to Drive once; nothing is downloaded). The frozen backbone's features are
+    # extracted once and cached as a memmap in FEATURE_DIR, so each epoch only trains the Dense head;
+    # TRANSFER_FINE_TUNE_EPOCHS > 0 then fine-tunes the top backbone layers on the augmented images.
+    BACKBONE = 'mobilenet_v2' # 'mobilenet_v2', 'resnet50_v2' or 'efficientnet_b0'
+    BACKBONE_WEIGHTS = None
+    FEATURE_DIR = '/content/drive/MyDrive/NN Dataset/features'
+    TRANSFER_FINE_TUNE_EPOCHS = 0
+    if BACKBONE_WEIGHTS:
+        transfer_model, transfer_report = train_transfer(
+            data, labels, train_idx, val_idx, image_paths, BACKBONE, BACKBONE_WEIGHTS, FEATURE_DIR,
+            epochs=30, fine_tune_epochs=TRANSFER_FINE_TUNE_EPOCHS,
+            callbacks=[EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)])
+        print(f"Feature extraction: {transfer_report['extract_seconds']:.1f}s once; head epochs "
+              f"{np.median(transfer_report['head_epoch_seconds']):.2f}s vs "
+              f"{np.median(history.history['epoch_seconds']):.2f}s for the CNN")
 else:
     print("Model training skipped: No data loaded or split.")
 
@@ -310,26 +296,25 @@ ROC Curve and AUC: Useful for binary classification problems to evaluate the tra
 """
 
 # Evaluate
-from sklearn.metrics import classification_report, confusion_matrix
 import matplotlib.pyplot as plt
 import seaborn as sns
-
-if 'model' in locals() and 'X_test' in locals() and X_test.size > 0:
-    # Evaluate the model on the test set
-    loss, accuracy = model.evaluate(X_test, y_test, verbose=0)
-    print(f"\nTest Loss: {loss:.4f}")
-    print(f"Test Accuracy: {accuracy:.4f}")
-
-    # Make predictions on the test set
-    y_pred_proba = model.predict(X_test)
-    y_pred = (y_pred_proba > 0.5).astype(int) # Convert probabilities to binary predictions (0 or 1)
-
-    # Classification Report
-    print("\nClassification Report:")
-    print(classification_report(y_test, y_pred, target_names=['No Tumor', 'Yes Tumor']))
+from brain_tumor.evaluate import evaluate_model, print_evaluation # Single-pass, vectorized evaluation
+
+if 'model' in locals() and 'test_idx' in locals() and test_idx.size > 0:
+    # One batched pass over the test set; loss, accuracy, report, confusion matrix,
+    # ROC/AUC and a threshold sweep are all computed from those probabilities.
+    # For test sets too large for memory, pass bins=4096 to keep only histograms.
+    evaluation, test_evaluator = evaluate_model(model, test_dataset, threshold=0.5)
+    y_pred_proba = test_evaluator.probabilities # Same order as test_idx / y_test
+    print_evaluation(evaluation)
+    if 'transfer_model' in locals():
+        transfer_evaluation, _ = evaluate_model(transfer_model, test_dataset, threshold=0.5)
+        print(f"\nTransfer ({BACKBONE}) vs CNN: test accuracy {transfer_evaluation['accuracy']:.4f} vs "
+              f"{evaluation['accuracy']:.4f}, AUC {transfer_evaluation.get('auc', float('nan')):.4f} vs "
+              f"{evaluation.get('auc', float('nan')):.4f}")
 
     # Confusion Matrix
-    cm = confusion_matrix(y_test, y_pred)
+    cm = evaluation['confusion_matrix']
     plt.figure(figsize=(6, 5))
     sns.heatmap(cm, annot=True, fmt='d', cmap='Blues',
                 xticklabels=['Predicted No Tumor', 'Predicted Yes Tumor'],
@@ -339,6 +324,17 @@ if 'model' in locals() and 'X_test' in locals() and X_test.size > 0:
     plt.ylabel('True Label')
     plt.show()
 
+    # ROC Curve
+    if 'roc' in evaluation:
+        plt.figure(figsize=(6, 5))
+        plt.plot(evaluation['roc']['fpr'], evaluation['roc']['tpr'], label=f"AUC = {evaluation['auc']:.3f}")
+        plt.plot([0, 1], [0, 1], linestyle='--', color='grey')
+        plt.title('ROC Curve')
+        plt.xlabel('False Positive Rate')
+        plt.ylabel('True Positive Rate')
+        plt.legend(loc='lower right')
+        plt.show()
+
     # Plot training history (accuracy and loss over epochs)
     if 'history' in locals():
         plt.figure(figsize=(12, 5))
@@ -364,36 +360,11 @@ if 'model' in locals() and 'X_test' in locals() and X_test.size > 0:
 else:
     print("Model evaluation skipped: No model or test data available.")
 
-from sklearn.metrics import classification_report, confusion_matrix
 import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np # Make sure numpy is imported for smoothing functions
 
-if 'model' in locals() and 'X_test' in locals() and X_test.size > 0:
-    # Evaluate the model on the test set
-    loss, accuracy = model.evaluate(X_test, y_test, verbose=0)
-    print(f"\nTest Loss: {loss:.4f}")
-    print(f"Test Accuracy: {accuracy:.4f}")
-
-    # Make predictions on the test set
-    y_pred_proba = model.predict(X_test)
-    y_pred = (y_pred_proba > 0.5).astype(int) # Convert probabilities to binary predictions (0 or 1)
-
-    # Classification Report
-    print("\nClassification Report:")
-    print(classification_report(y_test, y_pred, target_names=['No Tumor', 'Yes Tumor']))
-
-    # Confusion Matrix
-    cm = confusion_matrix(y_test, y_pred)
-    plt.figure(figsize=(6, 5))
-    sns.heatmap(cm, annot=True, fmt='d', cmap='Blues',
-                xticklabels=['Predicted No Tumor', 'Predicted Yes Tumor'],
-                yticklabels=['Actual No Tumor', 'Actual Yes Tumor'])
-    plt.title('Confusion Matrix')
-    plt.xlabel('Predicted Label')
-    plt.ylabel('True Label')
-    plt.show()
-
+# Smoothed training curves; the test-set metrics above are not recomputed here
+if 'model' in locals() and 'evaluation' in locals():
     # Plot training history (accuracy and loss over epochs)
     if 'history' in locals():
         # --- START OF ADJUSTMENT FOR SMOOTHING ---
@@ -464,9 +435,9 @@ from IPython.display import display, clear_output
 from ipywidgets import FileUpload, Button, Output, VBox, HTML
 import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
-from PIL import Image
-import numpy as np
-import io
+from brain_tumor.infer import predict_image as predict_image_array # Single-image prediction (no TF import of its own)
+from brain_tumor.infer import gradcam_fn # Cached batched Grad-CAM for the model
+from brain_tumor.explain import overlay # Heatmap over the scan
 
 # Create widgets
 upload_widget = FileUpload(
@@ -496,28 +467,24 @@ def predict_image(image_bytes):
 
 
     try:
-        # Load and preprocess the uploaded image
-        img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-        img = img.resize(TARGET_SIZE)
-        img_array = np.array(img) / 255.0 # Normalize
-        img_array = np.expand_dims(img_array, axis=0) # Add batch dimension
-
-        # Make prediction
-        prediction = model.predict(img_array)
-        probability = prediction[0][0] # Get the probability for the 'yes tumor' class
-
-        # Determine the predicted class
-        predicted_class = "Yes Tumor" if probability > 0.5 else "No Tumor"
-        # Confidence calculation can be improved for binary classification
-        # It's usually the probability of the predicted class
-        confidence = probability if predicted_class == "Yes Tumor" else (1 - probability)
+        # Decode, resize, normalize and predict with the same code as batch inference and serving
+        result, img = predict_image_array(model, image_bytes, TARGET_SIZE)
+        predicted_class = result['label']
+        # Confidence is the probability of the predicted class
+        confidence = result['confidence']
 
         # Display the image and prediction
         clear_output(wait=True)
+        # Grad-CAM on the last Conv2D: where the model found the evidence for the predicted class
+        _, heatmaps = gradcam_fn(model)(img[np.newaxis])
         with output_widget:
-            plt.imshow(img)
-            plt.title(f"Prediction: {predicted_class} (Confidence: {confidence:.2f})") # Added "Confidence: " for clarity
-            plt.axis('off') # Hide axes
+            fig, axes = plt.subplots(1, 2, figsize=(8, 4))
+            axes[0].imshow(img)
+            axes[0].set_title(f"Prediction: {predicted_class} (Confidence: {confidence:.2f})") # Added "Confidence: " for clarity
+            axes[1].imshow(overlay(img, heatmaps[0].numpy()))
+            axes[1].set_title("Grad-CAM")
+            for ax in axes:
+                ax.axis('off') # Hide axes
             plt.show()
 
     except Exception as e:
@@ -0,0 +1,117 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from brain_tumor.bench import write_synthetic_dataset
+from brain_tumor.cache import PreprocessedCache, ShardedImages
+from brain_tumor.data import load_image_folders
+
+SIZE = (32, 32)
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    return write_synthetic_dataset(str(tmp_path / 'data'), count_per_class=6, size=(48, 48))
+
+
+def _load(cache_dir, class_dirs):
+    return PreprocessedCache(str(cache_dir), SIZE).load(class_dirs, num_workers=1)
+
+
+def _assert_same_as_decoding(class_dirs, data, labels, paths):
+    expected, expected_labels, expected_paths, _ = load_image_folders(class_dirs, SIZE, num_workers=1)
+    assert paths == expected_paths
+    np.testing.assert_array_equal(labels, expected_labels)
+    np.testing.assert_array_equal(np.asarray(data), expected)
+
+
+def test_warm_load_decodes_nothing(tmp_path, dataset):
+    _, _, _, cold = _load(tmp_path / 'cache', dataset)
+    data, labels, paths, warm = _load(tmp_path / 'cache', dataset)
+    assert (cold.loaded, cold.cached) == (12, 0) # loaded counts every row, cached the ones not decoded
+    assert (warm.loaded, warm.cached) == (12, 12)
+    assert isinstance(data, np.memmap)
+    _assert_same_as_decoding(dataset, data, labels, paths)
+
+
+def test_changed_file_is_decoded_again(tmp_path, dataset):
+    _load(tmp_path / 'cache', dataset)
+    changed = os.path.join(dataset[1], sorted(os.listdir(dataset[1]))[0])
+    Image.new('RGB', (48, 48), (255, 0, 0)).save(changed)
+    os.utime(changed, ns=(1, 1)) # A different mtime even on coarse-grained filesystems
+    data, labels, paths, report = _load(tmp_path / 'cache', dataset)
+    assert (report.loaded, report.cached) == (12, 11)
+    _assert_same_as_decoding(dataset, data, labels, paths)
+
+
+def test_added_and_removed_files(tmp_path, dataset):
+    cache = PreprocessedCache(str(tmp_path / 'cache'), SIZE)
+    _, _, old_paths, _ = cache.load(dataset, num_workers=1)
+    os.remove(old_paths[0])
+    Image.new('RGB', (40, 40), (10, 200, 30)).save(os.path.join(dataset[0], 'added.png'))
+    data, labels, paths, report = cache.load(dataset, num_workers=1)
+    assert (report.loaded, report.cached) == (12, 11)
+    assert old_paths[0] not in paths and old_paths[0] not in cache.index['entries']
+    assert isinstance(data, ShardedImages) # The new image went to a second shard
+    _assert_same_as_decoding(dataset, data, labels, paths)
+
+
+def test_sharded_view_indexing(tmp_path, dataset):
+    cache = PreprocessedCache(str(tmp_path / 'cache'), SIZE)
+    cache.load([dataset[0]], num_workers=1)
+    data, _, _, _ = cache.load(dataset, num_workers=1)
+    assert isinstance(data, ShardedImages)
+    full = np.asarray(data)
+    rows = np.array([11, 0, 6, 5, 6])
+    np.testing.assert_array_equal(data[rows], full[rows])
+    np.testing.assert_array_equal(data[3:9], full[3:9])
+    np.testing.assert_array_equal(data[-1], full[-1])
+    np.testing.assert_array_equal(data[np.arange(12) % 3 == 0], full[::3])
+
+
+def test_hashes_are_kept_until_the_file_changes(tmp_path, dataset):
+    from brain_tumor.dedup import dhash
+
+    cache = PreprocessedCache(str(tmp_path / 'cache'), SIZE)
+    data, _, paths, _ = cache.load(dataset, num_workers=1)
+    np.testing.assert_array_equal(cache.hashes(paths), dhash(data))
+    assert all('dhash' in cache.index['entries'][path] for path in paths)
+
+    Image.new('RGB', (48, 48), (0, 0, 255)).save(paths[0])
+    os.utime(paths[0], ns=(1, 1))
+    data, _, paths, _ = cache.load(dataset, num_workers=1)
+    assert 'dhash' not in cache.index['entries'][paths[0]]
+    np.testing.assert_array_equal(cache.hashes(paths), dhash(np.asarray(data)))
+
+
+def test_empty_folders_give_an_empty_array(tmp_path):
+    class_dirs = [str(tmp_path / 'no'), str(tmp_path / 'yes')]
+    for path in class_dirs:
+        os.makedirs(path)
+    data, labels, paths, report = _load(tmp_path / 'cache', class_dirs)
+    assert data.shape == (0, SIZE[1], SIZE[0], 3) and data.dtype == np.uint8
+    assert len(labels) == 0 and paths == [] and report.loaded == 0
+
+
+def test_sharded_view_reports_its_size(tmp_path, dataset):
+    cache = PreprocessedCache(str(tmp_path / 'cache'), SIZE)
+    cache.load([dataset[0]], num_workers=1)
+    data, _, _, _ = cache.load(dataset, num_workers=1)
+    assert isinstance(data, ShardedImages)
+    full = np.asarray(data)
+    assert (data.size, data.nbytes) == (full.size, full.nbytes)
+
+
+def test_compact_sees_other_processes_updates(tmp_path, dataset):
+    stale = PreprocessedCache(str(tmp_path / 'cache'), SIZE)
+    other = PreprocessedCache(str(tmp_path / 'cache'), SIZE)
+    other.load([dataset[0]], num_workers=1)
+    other.load(dataset, num_workers=1)
+    stale.compact()
+    data, labels, paths, report = PreprocessedCache(str(tmp_path / 'cache'), SIZE).load(dataset, num_workers=1)
+    assert report.cached == 12 # compact() kept the other process's entries
+    assert isinstance(data, np.memmap)
+    assert sorted(os.listdir(stale.root)) == ['.lock', 'index.json', 'shard_00002.npy']
+    _assert_same_as_decoding(dataset, data, labels, paths)
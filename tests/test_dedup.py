@@ -0,0 +1,80 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from brain_tumor.dedup import (HashIndex, dataset_split, duplicate_groups, first_of_each_group, grouped_split,
+                               hamming_distance)
+from brain_tumor.pipeline import split_indices
+
+
+def _random_hashes(count, seed=0, near=40):
+    """Random 64-bit hashes plus `near` copies of some of them with 0-6 flipped bits."""
+    rng = np.random.default_rng(seed)
+    hashes = rng.integers(0, 2 ** 63, size=count, dtype=np.int64).astype(np.uint64)
+    copies = hashes[rng.integers(0, count, size=near)].copy()
+    for i in range(near):
+        for bit in rng.choice(64, size=rng.integers(0, 7), replace=False):
+            copies[i] ^= np.uint64(1) << np.uint64(bit)
+    return np.concatenate([hashes, copies])
+
+
+def _brute_force_pairs(hashes, max_distance):
+    return {(i, j) for i, j in itertools.combinations(range(len(hashes)), 2)
+            if hamming_distance(hashes[i], hashes[j]) <= max_distance}
+
+
+@pytest.mark.parametrize('max_distance', [0, 2, 4, 6])
+def test_hash_index_matches_brute_force(max_distance):
+    hashes = _random_hashes(300, seed=max_distance)
+    pairs = {tuple(sorted(map(int, pair))) for pair in HashIndex(hashes, max_distance).pairs()}
+    assert pairs == _brute_force_pairs(hashes, max_distance)
+
+
+def test_duplicate_groups_are_connected_components():
+    hashes = np.array([0b0, 0b1, 0b11, 0xFF00, 0xFF01, 0x0F0F0F0F0F0F0F0F], dtype=np.uint64)
+    groups = duplicate_groups(hashes, max_distance=1)
+    assert groups[0] == groups[1] == groups[2] # 0-1-3 chained at distance 1
+    assert groups[3] == groups[4]
+    assert len(set(groups.tolist())) == 3
+    np.testing.assert_array_equal(first_of_each_group(groups), [0, 3, 5])
+
+
+def _labelled_groups(seed=0, count=200):
+    rng = np.random.default_rng(seed)
+    groups = rng.integers(0, count // 3, size=count)
+    labels = (groups % 2).astype(int) # Copies of a scan share its label
+    return labels, groups
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_groups_never_span_splits(seed):
+    labels, groups = _labelled_groups(seed)
+    splits = split_indices(labels, groups=groups)
+    assert sorted(np.concatenate(splits).tolist()) == list(range(len(labels)))
+    members = [set(groups[split].tolist()) for split in splits]
+    assert not (members[0] & members[1] or members[0] & members[2] or members[1] & members[2])
+
+
+def test_grouped_split_modes():
+    labels, groups = _labelled_groups()
+    for split, expected in zip(grouped_split(labels, None, None), split_indices(labels)):
+        np.testing.assert_array_equal(split, expected)
+    for split, expected in zip(grouped_split(labels, groups, 'group'), split_indices(labels, groups=groups)):
+        np.testing.assert_array_equal(split, expected)
+    kept = np.concatenate(grouped_split(labels, groups, 'drop'))
+    assert sorted(kept.tolist()) == first_of_each_group(groups).tolist()
+    with pytest.raises(ValueError):
+        grouped_split(labels, groups, 'merge')
+
+
+def test_dataset_split_keeps_copies_together():
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 256, size=(60, 16, 16, 3), dtype=np.uint8)
+    data[50:] = data[:10] # Ten exact copies
+    labels = np.arange(60) % 2
+    labels[50:] = labels[:10]
+    splits = dataset_split(data, labels, verbose=False)
+    for original in range(10):
+        homes = [k for k, split in enumerate(splits) if original in split or original + 50 in split]
+        assert len(homes) == 1
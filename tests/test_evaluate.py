@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from sklearn.metrics import accuracy_score, confusion_matrix, log_loss, precision_recall_fscore_support, roc_auc_score
+
+from brain_tumor.evaluate import Evaluator
+
+
+def _predictions(count=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = rng.integers(0, 2, size=count)
+    probabilities = np.clip(rng.normal(0.35 + 0.3 * labels, 0.2), 0.0, 1.0)
+    return labels, probabilities
+
+
+def _evaluate(labels, probabilities, batch_size=64, **kwargs):
+    evaluator = Evaluator(**kwargs)
+    for i in range(0, len(labels), batch_size):
+        evaluator.update(labels[i:i + batch_size], probabilities[i:i + batch_size])
+    return evaluator.result()
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_exact_metrics_match_sklearn(seed):
+    labels, probabilities = _predictions(seed=seed)
+    result = _evaluate(labels, probabilities)
+    predicted = (probabilities > 0.5).astype(int)
+    assert result['count'] == len(labels)
+    assert np.isclose(result['loss'], log_loss(labels, np.clip(probabilities, 1e-7, 1 - 1e-7)))
+    assert np.isclose(result['accuracy'], accuracy_score(labels, predicted))
+    np.testing.assert_array_equal(result['confusion_matrix'], confusion_matrix(labels, predicted))
+    assert np.isclose(result['auc'], roc_auc_score(labels, probabilities))
+    precision, recall, f1, support = precision_recall_fscore_support(labels, predicted)
+    for k, name in enumerate(('No Tumor', 'Yes Tumor')):
+        row = result['report'][name]
+        assert np.allclose([row['precision'], row['recall'], row['f1-score']], [precision[k], recall[k], f1[k]])
+        assert row['support'] == support[k]
+
+
+def test_exact_auc_with_ties():
+    labels = np.array([0, 1, 0, 1, 1, 0, 1, 0])
+    probabilities = np.array([0.2, 0.2, 0.5, 0.5, 0.9, 0.1, 0.7, 0.7])
+    assert np.isclose(_evaluate(labels, probabilities, batch_size=3)['auc'], roc_auc_score(labels, probabilities))
+
+
+def test_binned_metrics_match_exact_on_the_bin_grid():
+    labels, probabilities = _predictions()
+    bins = 100
+    # Scores at bin centres: the histograms lose nothing, so every metric is exact
+    on_grid = (np.floor(probabilities * bins).clip(0, bins - 1) + 0.5) / bins
+    exact = _evaluate(labels, on_grid)
+    binned = _evaluate(labels, on_grid, bins=bins)
+    assert np.isclose(binned['auc'], roc_auc_score(labels, on_grid))
+    for key in ('loss', 'accuracy', 'best_threshold'):
+        assert np.isclose(binned[key], exact[key])
+    np.testing.assert_array_equal(binned['confusion_matrix'], exact['confusion_matrix'])
+    for key in ('tpr', 'fpr', 'accuracy'):
+        np.testing.assert_allclose(binned['sweep'][key], exact['sweep'][key])
+
+
+def test_binned_auc_is_close_to_exact():
+    labels, probabilities = _predictions(count=5000, seed=3)
+    binned = _evaluate(labels, probabilities, bins=1000)
+    assert abs(binned['auc'] - roc_auc_score(labels, probabilities)) < 1e-3
+    assert np.isclose(binned['accuracy'], accuracy_score(labels, probabilities > 0.5))
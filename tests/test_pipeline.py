@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from brain_tumor.pipeline import balance_report, balanced_indices, class_weights, split_indices
+
+
+def _imbalanced_labels(negatives=800, positives=200):
+    return np.array([0] * negatives + [1] * positives)
+
+
+@pytest.mark.parametrize('fractions', [(0.5, 0.5), (0.25, 0.75), (0.9, 0.1)])
+def test_balanced_indices_shares(fractions):
+    labels = _imbalanced_labels()
+    indices = np.arange(len(labels)) + 1000 # Row ids need not start at 0
+    rng = np.random.default_rng(0)
+    draws = np.concatenate([balanced_indices(indices, labels, np.array(fractions), rng) for _ in range(20)])
+    assert len(draws) == 20 * len(labels)
+    assert set(np.unique(draws)) <= set(indices.tolist())
+    shares = np.bincount(labels[draws - 1000], minlength=2) / len(draws)
+    np.testing.assert_allclose(shares, fractions, atol=0.01)
+
+
+def test_balanced_indices_cycles_through_the_minority():
+    labels = _imbalanced_labels(90, 10)
+    draws = balanced_indices(np.arange(100), labels, np.array([0.5, 0.5]), np.random.default_rng(1))
+    minority = draws[labels[draws] == 1]
+    # Each minority image is repeated about equally often, not drawn with replacement
+    counts = np.bincount(minority, minlength=100)[90:]
+    assert counts.max() - counts.min() <= 1
+
+
+def test_class_weights_give_the_target_shares():
+    labels = _imbalanced_labels()
+    for target_ratio in (None, (1, 1), (1, 3)):
+        weights = class_weights(labels, target_ratio)
+        counts = np.bincount(labels)
+        loss_shares = counts * np.array([weights[0], weights[1]])
+        expected = np.array(target_ratio or (1, 1), dtype=float)
+        np.testing.assert_allclose(loss_shares / loss_shares.sum(), expected / expected.sum())
+        # The mean weight per image stays 1, so the loss scale and learning rate are unchanged
+        assert np.isclose(loss_shares.sum(), len(labels))
+
+
+def test_balance_report():
+    report = balance_report(_imbalanced_labels(), (1, 1))
+    assert report['0']['count'] == 800 and report['1']['count'] == 200
+    assert np.isclose(report['1']['natural_fraction'], 0.2)
+    assert np.isclose(report['1']['target_fraction'], 0.5)
+    assert np.isclose(report['1']['draws_per_image'], 2.5)
+
+
+def test_split_indices_proportions_and_stratification():
+    labels = _imbalanced_labels()
+    train_idx, val_idx, test_idx = split_indices(labels)
+    assert (len(train_idx), len(val_idx), len(test_idx)) == (600, 200, 200)
+    assert sorted(np.concatenate([train_idx, val_idx, test_idx]).tolist()) == list(range(1000))
+    for split in (train_idx, val_idx, test_idx):
+        assert np.isclose(labels[split].mean(), 0.2)
+
+
+def test_split_indices_rejects_tiny_classes():
+    with pytest.raises(ValueError, match="at least 2 samples"):
+        split_indices(np.array([0, 0, 0, 0, 1]))
+    with pytest.raises(ValueError, match="train\\+validation"):
+        split_indices(np.array([0, 0, 0, 0, 0, 1, 1]))